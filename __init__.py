@@ -1,33 +1,9 @@
-import bpy, os, sys
-
-def checkSubmodules():
-    pillow_missing = False
-    construct_missing = False
-
-    try:
-        import PIL
-    except ModuleNotFoundError:
-        pillow_missing = True
-    
-    try:
-        import construct
-    except ModuleNotFoundError:
-        construct_missing = True
-    
-    return pillow_missing, construct_missing
-
-install_required = False
-
-if any(checkSubmodules()):
-    install_required = True
-else:
-    from PIL import Image
-    from PIL import ImageFilter
-
-import numpy as np
+import bpy, os, sys, logging, json, hashlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 
 from bpy.types import AddonPreferences
-from bpy.props import StringProperty, CollectionProperty, IntProperty
+from bpy.props import StringProperty, CollectionProperty, IntProperty, BoolProperty, EnumProperty
 
 bl_info = {
     "name": "Starfield Planet Experiments",
@@ -39,31 +15,65 @@ bl_info = {
     "category": "Development"
 }
 
+def checkSubmodules():
+    pillow_missing = importlib.util.find_spec("PIL") is None
+
+    return (pillow_missing,)
+
+install_required = None
+
+def installRequired():
+    global install_required
+    if install_required is None:
+        install_required = any(checkSubmodules())
+    return install_required
+
+def lazyImport(name):
+    """Returns a module that is only executed on first attribute access.
+
+    Keeps Blender startup free of the addon's own heavy modules until a
+    planet operator actually runs. None if not installed. Only touch these
+    from the main thread first; LazyLoader isn't thread-safe before 3.12.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
 addon_folder = os.path.dirname(os.path.abspath(__file__))
 utils_folder = os.path.join(addon_folder, "utils")
 layers_folder = os.path.join(addon_folder, "layers")
+cache_folder = os.path.join(addon_folder, "cache")
 
-if not os.path.isdir(utils_folder):
-    os.makedirs(utils_folder)
-
-if not os.path.isdir(layers_folder):
-    os.makedirs(layers_folder)
+def ensureFolders():
+    os.makedirs(utils_folder, exist_ok=True)
+    os.makedirs(layers_folder, exist_ok=True)
 
 dir = os.path.dirname(os.path.realpath(__file__))
 if dir not in sys.path:
 	sys.path.append(dir)
 
-if not install_required:
-    import biom
+# Reloading the addon (F8 / Reload Scripts) runs this file again in the same
+# namespace: drop the addon's own modules so they're imported fresh.
+if "biom" in globals():
+    for name in ("batchcli", "biom", "biomcache", "biomeregistry", "biomhistory", "palette", "planetmesh", "profiling"):
+        sys.modules.pop(name, None)
 
-import palette
+import profiling
 
-# Reloads on F8 hotkey press
-if "bpy" in locals():
-    import imp
-    if not install_required:
-        imp.reload(biom)
-    imp.reload(palette)
+# NumPy and Pillow are imported inside the functions that use them instead:
+# LazyLoader modules aren't safe to first touch from the layer worker threads.
+biom = lazyImport("biom")
+biomcache = lazyImport("biomcache")
+biomhistory = lazyImport("biomhistory")
+palette = lazyImport("palette")
+planetmesh = lazyImport("planetmesh")
 
 """
 Classes
@@ -76,9 +86,81 @@ class SFPlanetsPreferences(AddonPreferences):
         name="Missing submodules",
         default=""
     )
+
+    export_pngs: BoolProperty(
+        name="Export biome/resource PNGs",
+        description="Write planet images to the images folder on load and save (for editing them in external image editors)",
+        default=True
+    )
+
+    cache_size_mb: IntProperty(
+        name="Decode cache size (MB)",
+        description="Disk space for cached decoded planets, least recently used ones are evicted first",
+        default=256,
+        min=0
+    )
+
+    history_size_mb: IntProperty(
+        name="Save history size (MB)",
+        description="Memory for the compressed history of loaded and saved grids, oldest steps are dropped first",
+        default=64,
+        min=1
+    )
+
+    mesh_subdivisions: IntProperty(
+        name="Planet mesh subdivisions",
+        description="Quads per side of each hemisphere of the generated planet mesh (applies to newly created planets)",
+        default=64,
+        min=4,
+        max=512
+    )
+
+    layer_format: EnumProperty(
+        name="Layer format",
+        description="How Gen layers writes color masks",
+        items=[
+            ('png', "PNG per color", "One grayscale fill and edge PNG per color"),
+            ('rgba', "Packed RGBA", "Up to four colors per PNG, one per channel"),
+            ('npz', "NumPy archive", "All masks of a map in one compressed .npz"),
+        ],
+        default='png'
+    )
+
+    log_level: EnumProperty(
+        name="Log level",
+        description="Console logging of the addon. Debug adds per-stage timings and diagnostics",
+        items=[
+            ('WARNING', "Warnings", ""),
+            ('INFO', "Info", ""),
+            ('DEBUG', "Debug", ""),
+        ],
+        default='WARNING',
+        update=lambda self, context: configureLogging(self)
+    )
+
+    track_memory: BoolProperty(
+        name="Track peak memory",
+        description="Record peak memory of each stage with tracemalloc (slows the addon down)",
+        default=False,
+        update=lambda self, context: configureLogging(self)
+    )
     
     def draw(self, context):
         layout = self.layout
+        layout.prop(self, "export_pngs")
+        layout.prop(self, "cache_size_mb")
+        layout.prop(self, "history_size_mb")
+        layout.prop(self, "layer_format")
+        layout.prop(self, "mesh_subdivisions")
+
+        box = layout.box()
+        box.label(text="Diagnostics")
+        row = box.row()
+        row.prop(self, "log_level")
+        row.prop(self, "track_memory")
+        row = box.row()
+        row.operator("sf_planets.dump_profile_report")
+        row.operator("sf_planets.dump_profile_report", text="Dump and reset").reset = True
         missing = checkSubmodules()
 
         if any(missing):
@@ -118,7 +200,7 @@ class SF_PT_Planets(bpy.types.Panel):
     def draw(self, context):
         layout = self.layout
 
-        if install_required:
+        if installRequired():
             box = layout.box()
             box.alert = True
             box.label(text="MISSING SUBMODULES")
@@ -149,7 +231,9 @@ class SF_PT_Planets(bpy.types.Panel):
                 mat, "selected_biome"
             )
 
-            box.operator("sf_planets.set_biome_id")
+            row = box.row()
+            row.operator("sf_planets.set_biome_id")
+            row.operator("sf_planets.remap_biomes")
 
             box = layout.box()
             col = box.column()
@@ -164,12 +248,37 @@ class SF_PT_Planets(bpy.types.Panel):
             layout.separator()
 
             layout.operator("sf_planet.save_biom_file")
+            row = layout.row()
+            row.operator("sf_planets.revert_planet_state")
+            row.operator("sf_planets.revert_planet_state", text="Redo save").redo = True
+            if save_status:
+                layout.label(text=save_status)
 
 """
 Operators
 """
 
 
+class DumpProfileReport(bpy.types.Operator):
+    bl_idname = "sf_planets.dump_profile_report"
+    bl_label = "Dump profile report"
+    bl_description = "Write timings of every addon stage so far to the 'sf_planets_profile' text block"
+
+    reset: BoolProperty(default=False)
+
+    def execute(self, context):
+        report = profiling.report()
+
+        text = bpy.data.texts.get("sf_planets_profile") or bpy.data.texts.new("sf_planets_profile")
+        text.from_string(report)
+        profiling.log.info("Profile report:\n%s", report)
+
+        if self.reset:
+            profiling.reset()
+
+        self.report({'INFO'}, "Profile report written to the 'sf_planets_profile' text block")
+        return {'FINISHED'}
+
 class InstallMissingSubmodules(bpy.types.Operator):
     bl_idname = "sf_planets.install_missing_submodules"
     bl_label = "Install missing submodules (Freezes for some time, it's normal)"
@@ -302,8 +411,14 @@ class GenLayerImages(bpy.types.Operator):
             self.report("Invalid planet: addon looks for planet_sphere_unit:0 with valid material")
             return {'CANCELLED'}
         
-        planet_name = obj.data.materials[0]["planet_name"]
-        genLayerImages(planet_name)
+        mat = obj.data.materials[0]
+        planet_name = mat["planet_name"]
+        regenerated = genLayerImages(
+            planet_name,
+            layer_format=context.preferences.addons[__name__].preferences.layer_format,
+            biome_ids=[b.biome_id for b in mat.biome_data],
+        )
+        self.report({'INFO'}, f"{regenerated} layers regenerated for {planet_name}")
         return {'FINISHED'}
 
 class OpenImagesFolder(bpy.types.Operator):
@@ -313,13 +428,14 @@ class OpenImagesFolder(bpy.types.Operator):
     bl_options = {'UNDO'}
 
     def execute(self, context):
+        ensureFolders()
         os.startfile(utils_folder)
         return {'FINISHED'}
 
 class SaveEditedImages(bpy.types.Operator):
     bl_idname = "sf_planets.save_edited_images"
     bl_label = "Save edited images"
-    bl_description = "Saves edited biome and resource images to disk"
+    bl_description = "Packs edited biome and resource images into the .blend, exporting them as PNGs if enabled"
     bl_options = {'UNDO'}
 
     def execute(self, context):
@@ -332,17 +448,42 @@ class SaveEditedImages(bpy.types.Operator):
         mat = obj.data.materials[0]
 
         biom_node = mat.node_tree.nodes.get("biomes")
-        res_node = mat.node_tree.nodes.get("biomes")
+        res_node = mat.node_tree.nodes.get("resources")
 
         if biom_node == None or res_node == None:
             self.report({'ERROR'}, "Can't find biome or resource image node in material!")
             return {'CANCELLED'}
         
-        res_node.image.save()
-        biom_node.image.save()
+        try:
+            storePlanetImage(res_node.image)
+            storePlanetImage(biom_node.image)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
         self.report({'INFO'}, f"Images saved for {mat['planet_name']}")
         return {'FINISHED'}
 
+def searchBiomes(self, context, edit_text):
+    for biome_id, edid, name in biom.biomeRegistry().search(edit_text, limit=50):
+        yield f"{biome_id:08X} {name}", edid
+
+def resolveBiomeId(text):
+    """Form ID typed or picked in SetBiomeID, falling back to the best search match."""
+    text = text.strip()
+    if not text:
+        return None
+    registry = biom.biomeRegistry()
+    token = text.split()[0]
+    try:
+        biome_id = int(token, 16)
+    except ValueError:
+        biome_id = None
+    # Short hex-looking words like "bad" are more likely names than form IDs
+    if biome_id is not None and (biome_id in registry or len(token) >= 6):
+        return biome_id
+    matches = registry.search(text, limit=1)
+    return matches[0][0] if matches else biome_id
+
 class SetBiomeID(bpy.types.Operator):
     bl_idname = "sf_planets.set_biome_id"
     bl_label = "Set biome id"
@@ -350,7 +491,12 @@ class SetBiomeID(bpy.types.Operator):
     bl_options = {'UNDO'}
 
     old_id: IntProperty(default=0)
-    new_id: StringProperty(default="")
+    new_id: StringProperty(
+        default="",
+        description="Form ID, EDID or biome name",
+        search=searchBiomes,
+        search_options={'SUGGESTION'},
+    )
 
     @classmethod
     def poll(cls, context):
@@ -358,12 +504,23 @@ class SetBiomeID(bpy.types.Operator):
     
     def draw(self, context):
         layout = self.layout
-        layout.label(text=f"Old ID: {f'{self.old_id:08x}'}")
-        layout.prop(self, "new_id", text="New Form ID")
+        layout.label(text=f"Old ID: {f'{self.old_id:08x}'} ({biom.get_biome_names(self.old_id)[1]})")
+        layout.prop(self, "new_id", text="New Form ID", icon='VIEWZOOM')
+
+        biome_id = resolveBiomeId(self.new_id)
+        if biome_id is not None:
+            edid, name = biom.get_biome_names(biome_id)
+            layout.label(text=f"{biome_id:08x}: {name} ({edid})")
 
     def execute(self, context):
-        context.object.data.materials[0].biome_data[context.object.data.materials[0].selected_biome].biome_id = int(self.new_id, 16)
-        context.object.data.materials[0].biome_data[context.object.data.materials[0].selected_biome].name = biom.get_biome_names(int(self.new_id, 16))[1]
+        biome_id = resolveBiomeId(self.new_id)
+        if biome_id is None:
+            self.report({'ERROR'}, f"No biome matches '{self.new_id}'")
+            return {'CANCELLED'}
+
+        material = context.object.data.materials[0]
+        old_id = material.biome_data[material.selected_biome].biome_id
+        remapPlanetBiomes(material, {old_id: biome_id})
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -372,6 +529,74 @@ class SetBiomeID(bpy.types.Operator):
 
         return context.window_manager.invoke_props_dialog(self)
 
+class RevertPlanetState(bpy.types.Operator):
+    bl_idname = "sf_planets.revert_planet_state"
+    bl_label = "Undo save"
+    bl_description = "Restore the grids of the previous load or save of this planet into its images"
+    bl_options = {'UNDO'}
+
+    redo: BoolProperty(default=False, options={'SKIP_SAVE'})
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.object
+        if obj is None or not obj.data.materials or obj.data.materials[0] is None:
+            return False
+        return obj.data.materials[0].get("planet_name") in planet_histories
+
+    def execute(self, context):
+        material = context.object.data.materials[0]
+        planet_name = material["planet_name"]
+        history, biom_file = planet_histories[planet_name]
+
+        delta = history.redo(biom_file) if self.redo else history.undo(biom_file)
+        if delta is None:
+            self.report({'WARNING'}, "Nothing to restore")
+            return {'CANCELLED'}
+
+        biome_img, resource_img = biom_file.texture()
+        biom.writeImagePixels(planetImage(planet_name, "biomes"), biome_img)
+        biom.writeImagePixels(planetImage(planet_name, "resources"), resource_img)
+        material.biome_data.clear()
+        for biome_id in biom_file.biomeIds:
+            planet_biome = material.biome_data.add()
+            planet_biome.biome_id = biome_id
+            planet_biome.name = biom.get_biome_names(biome_id)[1]
+        material.selected_biome = 0
+
+        profiling.log.info("%s %s", "Redid" if self.redo else "Undid", delta.describe())
+        self.report({'INFO'}, f"{'Redid' if self.redo else 'Undid'} {delta.label}: {delta.cells} cells changed")
+        return {'FINISHED'}
+
+class RemapBiomes(bpy.types.Operator):
+    bl_idname = "sf_planets.remap_biomes"
+    bl_label = "Remap from file"
+    bl_description = "Replace biome ids by the old,new pairs of a mapping file, recoloring the biome image"
+    bl_options = {'UNDO'}
+
+    filepath: StringProperty(subtype="FILE_PATH")
+    filter_glob: StringProperty(default="*.csv;*.txt", options={'HIDDEN'})
+
+    def execute(self, context):
+        try:
+            mapping = biom.readBiomeMapping(self.filepath)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        material = context.object.data.materials[0]
+        before = len(material.biome_data)
+        changed = remapPlanetBiomes(material, mapping)
+        self.report(
+            {'INFO'},
+            f"Remapped {len(mapping)} biome ids, {before - len(material.biome_data)} merged, {changed} pixels recolored"
+        )
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
 class LoadBiomFile(bpy.types.Operator):
     bl_idname = "sf_planet.load_biom_file"
     bl_label = "Load .biom file"
@@ -385,12 +610,12 @@ class LoadBiomFile(bpy.types.Operator):
         planet_obj_name = "planet_sphere_unit:0"
 
         if planet_obj_name not in [o.name for o in bpy.data.objects]:
-            bpy.ops.wm.obj_import(
-                filepath=os.path.join(addon_folder, "planet.obj")
-            )
+            subdivisions = bpy.context.preferences.addons[__name__].preferences.mesh_subdivisions
+            planet_obj = bpy.data.objects.new(planet_obj_name, getPlanetMesh(subdivisions))
+            bpy.context.scene.collection.objects.link(planet_obj)
 
         elif planet_obj_name not in [o.name for o in bpy.context.scene.objects]:
-            bpy.context.scene.objects.link(bpy.data.objects[planet_obj_name])
+            bpy.context.scene.collection.objects.link(bpy.data.objects[planet_obj_name])
         
         bpy.context.view_layer.objects.active = bpy.data.objects["planet_sphere_unit:0"]
 
@@ -419,20 +644,25 @@ class SaveBiomFile(bpy.types.Operator):
         mat = obj.data.materials[0]
 
         biom_node = mat.node_tree.nodes.get("biomes")
-        res_node = mat.node_tree.nodes.get("biomes")
+        res_node = mat.node_tree.nodes.get("resources")
 
         if biom_node == None or res_node == None:
             self.report({'ERROR'}, "Can't find biome or resource image node in material!")
             return {'CANCELLED'}
         
-        res_node.image.save()
-        biom_node.image.save()
+        try:
+            storePlanetImage(res_node.image)
+            storePlanetImage(biom_node.image)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
 
         if not self.filename.endswith(".biom"):
             self.filename = f"{self.filename}.biom"
 
-        saveBiom(obj, os.path.join(self.directory, self.filename))
-        
+        saveBiomAsync(obj, os.path.join(self.directory, self.filename))
+        self.report({'INFO'}, f"Saving {self.filename} in the background")
+
         return {'FINISHED'}
     
     def invoke(self, context, event):
@@ -454,47 +684,226 @@ Functions
 def isPlanetValid(obj):
     return obj != None and len(obj.data.materials) >= 1 and obj.data.materials[0] != None and "planet_name" in obj.data.materials[0]
 
-def saveBiom(planet, save_path):
+def exportPngs():
+    return bpy.context.preferences.addons[__name__].preferences.export_pngs
+
+def planetImage(planet_name, suffix):
+    """Returns (creating if needed) the Blender image for a planet map.
+
+    Its settings are only set on creation: assigning the colorspace of an
+    existing image reloads its buffer and drops unsaved paint.
+    """
+    name = f"{planet_name}_{suffix}.png"
+    image = bpy.data.images.get(name)
+    if image is None:
+        image = bpy.data.images.new(name, width=biom.GRID_SIZE[1], height=2 * biom.GRID_SIZE[0])
+        image.filepath_raw = os.path.join(utils_folder, name)
+        image.file_format = 'PNG'
+        image.colorspace_settings.name = "Non-Color"
+    return image
+
+def exportPath(image):
+    """Where the PNG export of a map goes, in utils/."""
+    ensureFolders()
+    return os.path.join(utils_folder, image.name)
+
+def storePlanetImage(image):
+    """Packs the current pixels of a map into the .blend.
+
+    With PNG export on, they are also written to utils/ for external image
+    editors, as palette-indexed PNGs like the ones written on load; the
+    Blender image stays packed and isn't linked to that file. Raises
+    ValueError, after packing, if the map has off-palette pixels.
+    """
+    image.pack()
+    if exportPngs():
+        with profiling.span("png_write"):
+            indices = biom.pixelsToIds(
+                biom.readImagePixels(image), range(len(palette.palettedata_lists)), image.name
+            )
+            biom.indexedImage(indices).save(exportPath(image))
 
+def readPlanetImages(planet):
+    """Copies out everything a save needs from Blender data; main thread only."""
     planet_name = planet.data.materials[0]["planet_name"]
     biomes = planet.data.materials[0].biome_data
 
-    biom_img = Image.open(os.path.join(utils_folder, f"{planet_name}_biomes.png")).convert('RGB')
-    res_img = Image.open(os.path.join(utils_folder, f"{planet_name}_resources.png")).convert('RGB')
+    with profiling.span("pixels"):
+        biom_img = biom.readImagePixels(planetImage(planet_name, "biomes"))
+        res_img = biom.readImagePixels(planetImage(planet_name, "resources"))
 
-    biom_file = biom.BiomFile()
+    return tuple(b.biome_id for b in biomes), biom_img, res_img
 
-    biom_file.res_img = res_img
-    biom_file.biom_img = biom_img
-    biom_file.biomeIds = [b.biome_id for b in biomes]
+@profiling.timed("encode_biom")
+def encodeBiom(biomeIds, biom_img, res_img, save_path):
+    """Converts read-out images to a .biom and writes it atomically; safe off the main thread."""
+    biom_file = biom.BiomFile()
+    biom_file.biomeIds = biomeIds
 
-    biom_file.imgToArray()
+    biom_file.imgToArray(biom_img, res_img)
 
     biom_file.save(save_path)
-    pass
+    return biom_file
 
-def loadPlanet(planet_file):
-    planet_name = os.path.basename(planet_file).removesuffix(".biom")
-    biom_file = biom.BiomFile()
+save_executor = None
+pending_saves = dict()
+save_status = ""
+
+def saveBiomAsync(planet, save_path):
+    """Encodes and writes the planet on a worker thread; pollSaves reports the result.
+
+    Saves run one at a time, so repeated saves to one path land in order.
+    """
+    global save_executor
+    if save_executor is None:
+        save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sf_planets_save")
+
+    with profiling.span("save_biom"):
+        biomeIds, biom_img, res_img = readPlanetImages(planet)
+    future = save_executor.submit(encodeBiom, biomeIds, biom_img, res_img, save_path)
+    pending_saves[future] = (save_path, planet.data.materials[0]["planet_name"])
+    setSaveStatus(f"Saving {os.path.basename(save_path)}...")
+
+    if not bpy.app.timers.is_registered(pollSaves):
+        bpy.app.timers.register(pollSaves, first_interval=0.1)
+    return future
+
+def setSaveStatus(text):
+    global save_status
+    save_status = text
+    wm = bpy.context.window_manager
+    if wm is None:
+        return
+    for window in wm.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+def pollSaves():
+    """bpy.app.timers callback reporting finished background saves."""
+    for future, (save_path, planet_name) in list(pending_saves.items()):
+        if not future.done():
+            continue
+        del pending_saves[future]
+        error = future.exception()
+        if error is None:
+            profiling.log.info("Saved '%s'.", save_path)
+            setSaveStatus(f"Saved {os.path.basename(save_path)}")
+            recordPlanetState(planet_name, future.result(), f"save {os.path.basename(save_path)}")
+        else:
+            profiling.log.error("Saving '%s' failed: %s", save_path, error)
+            setSaveStatus(f"Saving {os.path.basename(save_path)} failed: {error}")
 
-    biom_file.load(planet_file)
+    return 0.1 if pending_saves else None
 
-    biom_file.texture()
-    biome_img = biom_file.biome_idx_img
-    resource_img = biom_file.res_idx_img
+def waitForSaves():
+    global save_executor
+    if save_executor is not None:
+        save_executor.shutdown(wait=True)
+        save_executor = None
+    pollSaves()
 
-    biome_img.save(os.path.join(utils_folder, f"{planet_name}_biomes.png"))
-    resource_img.save(os.path.join(utils_folder, f"{planet_name}_resources.png"))
+planet_cache = None
+
+def getPlanetCache():
+    global planet_cache
+    if planet_cache is None:
+        planet_cache = biomcache.BiomCache(cache_folder)
+    planet_cache.max_bytes = bpy.context.preferences.addons[__name__].preferences.cache_size_mb * 1024 * 1024
+    return planet_cache
+
+@profiling.timed("load_planet")
+def loadPlanet(planet_file):
+    planet_name = os.path.basename(planet_file).removesuffix(".biom")
+    cache = getPlanetCache()
+
+    with profiling.span("cache"):
+        biom_file, biome_img, resource_img = cache.load(planet_file)
+    profiling.log.info("Planet cache: %d hits, %d misses", cache.hits, cache.misses)
+    recordPlanetState(planet_name, biom_file, f"load {os.path.basename(planet_file)}")
+
+    for suffix, img in (("biomes", biome_img), ("resources", resource_img)):
+        image = planetImage(planet_name, suffix)
+        with profiling.span("pixels"):
+            biom.writeImagePixels(image, img)
+        image.pack()
+        if exportPngs():
+            # Written straight from the indexed image
+            with profiling.span("png_write"):
+                img.save(exportPath(image))
 
     return biom_file
 
+# Planet name -> (GridHistory, BiomFile at its current snapshot)
+planet_histories = dict()
+
+def recordPlanetState(planet_name, biom_file, label):
+    """Pushes a loaded or saved planet onto its grid history."""
+    history = planet_histories.get(planet_name, (None,))[0]
+    if history is None:
+        history = biomhistory.GridHistory()
+    addon = bpy.context.preferences.addons.get(__name__)
+    if addon:
+        history.max_bytes = addon.preferences.history_size_mb * 1024 * 1024
+    delta = history.push(biom_file, label)
+    if delta is not None:
+        profiling.log.info("%s", delta.describe())
+    planet_histories[planet_name] = (history, biom_file)
+
+@profiling.timed("planet_mesh")
+def getPlanetMesh(subdivisions):
+    """Returns the generated planet sphere mesh, reusing one already in the blend file."""
+    import numpy as np
+
+    mesh_name = f"planet_sphere_unit_{subdivisions}"
+    mesh = bpy.data.meshes.get(mesh_name)
+    if mesh is not None:
+        return mesh
+
+    verts, faces, loop_uvs = planetmesh.planetMeshData(subdivisions)
+
+    mesh = bpy.data.meshes.new(mesh_name)
+    mesh.from_pydata(verts, [], faces)
+    uv_layer = mesh.uv_layers.new(name="UVMap")
+    uv_layer.data.foreach_set("uv", loop_uvs.ravel())
+    mesh.polygons.foreach_set("use_smooth", np.ones(len(faces), dtype=bool))
+    mesh.update()
+    mesh.use_fake_user = True
+    return mesh
+
+@profiling.timed("remap_biomes")
+def remapPlanetBiomes(material, mapping):
+    """Applies an old -> new biome ID mapping to a planet material and its biome image.
+
+    The biome list is rewritten and, where biomes were merged, their pixels
+    are recolored in place, so no reload is needed. Returns the number of
+    pixels changed.
+    """
+    biomes = material.biome_data
+    table, lut = biom.remapTable([b.biome_id for b in biomes], mapping)
+    changed = biom.remapImagePixels(planetImage(material["planet_name"], "biomes"), lut)
+
+    selected = int(lut[material.selected_biome]) if material.selected_biome < len(lut) else 0
+    biomes.clear()
+    for biome_id in table:
+        planet_biome = biomes.add()
+        planet_biome.biome_id = biome_id
+        planet_biome.name = biom.get_biome_names(biome_id)[1]
+    material.selected_biome = selected
+
+    profiling.log.info("Remapped %d biome ids, %d pixels recolored", len(mapping), changed)
+    return changed
+
 def createPlanetMaterial(obj, planet, planet_name):
     if planet_name not in [mat.name for mat in bpy.data.materials]:
         planet_mat = bpy.data.materials.new(planet_name)
     else:
         planet_mat = bpy.data.materials[planet_name]
 
-    obj.data.materials[0] = planet_mat
+    if len(obj.data.materials) == 0:
+        obj.data.materials.append(planet_mat)
+    else:
+        obj.data.materials[0] = planet_mat
 
     planet_mat["planet_name"] = planet_name
 
@@ -504,25 +913,8 @@ def createPlanetMaterial(obj, planet, planet_name):
         planet_biome.biome_id = biome
         planet_biome.name = biom.get_biome_names(biome)[1]
 
-    if f"{planet_name}_resources.png" not in bpy.data.images:
-        res_img = bpy.data.images.load(
-            os.path.join(utils_folder, f"{planet_name}_resources.png")
-        )
-
-    else:
-        res_img = bpy.data.images[f"{planet_name}_resources.png"]
-
-    res_img.colorspace_settings.name = "Non-Color"
-
-    if f"{planet_name}_biomes.png" not in bpy.data.images:
-        biom_img = bpy.data.images.load(
-            os.path.join(utils_folder, f"{planet_name}_biomes.png")
-        )
-
-    else:
-        biom_img = bpy.data.images[f"{planet_name}_biomes.png"]
-
-    biom_img.colorspace_settings.name = "Non-Color"
+    res_img = planetImage(planet_name, "resources")
+    biom_img = planetImage(planet_name, "biomes")
 
     planet_mat.use_nodes = True
 
@@ -550,43 +942,240 @@ def createPlanetMaterial(obj, planet, planet_name):
 
     planet_mat.node_tree.nodes.active = biom_tex_node
 
-def genLayerImages(planet_name):
-    biom_img = Image.open(os.path.join(utils_folder, f"{planet_name}_biomes.png")).convert('RGB')
-    res_img = Image.open(os.path.join(utils_folder, f"{planet_name}_resources.png")).convert('RGB')
-
-    for idx, img in enumerate([biom_img, res_img]):
-
-        img_array = np.asarray(img)
-        unique = np.unique(img_array.reshape(-1, img_array.shape[2]), axis=0)
-
-        if idx == 0:
-            suffix = "biomes"
-        else:
-            suffix = "resources"
-
-        for col_idx, unique_color in enumerate(unique):
-            sel_img_array = np.copy(img_array)
-
-            sel_img_array[sel_img_array == unique_color] = 255
-            sel_img_array[sel_img_array != 255] = 0
-
-            unique_img = Image.fromarray(sel_img_array)
-            unique_img = unique_img.resize((1024, 2048))
-            unique_img = unique_img.filter(ImageFilter.GaussianBlur(radius=2.75))
-            unique_img = unique_img.filter(ImageFilter.SMOOTH_MORE)
-            unique_img = unique_img.filter(ImageFilter.SMOOTH_MORE)
-            unique_img = unique_img.filter(ImageFilter.EDGE_ENHANCE_MORE)
-            unique_img = unique_img.filter(ImageFilter.EDGE_ENHANCE)
-
-            unique_img.save(
-                os.path.join(layers_folder, f"{planet_name}_{suffix}_layer{col_idx}.png")
-            )
+def filterLayer(mask):
+    """Blurs/sharpens one color mask up to layer resolution, returns (fill, edge) images."""
+    from PIL import Image, ImageFilter
+
+    layer_img = Image.fromarray(mask, mode="L")
+    layer_img = layer_img.resize((1024, 2048))
+    layer_img = layer_img.filter(ImageFilter.GaussianBlur(radius=2.75))
+    layer_img = layer_img.filter(ImageFilter.SMOOTH_MORE)
+    layer_img = layer_img.filter(ImageFilter.SMOOTH_MORE)
+    layer_img = layer_img.filter(ImageFilter.EDGE_ENHANCE_MORE)
+    layer_img = layer_img.filter(ImageFilter.EDGE_ENHANCE)
+
+    edge_img = layer_img.filter(ImageFilter.FIND_EDGES)
+    edge_img = edge_img.filter(ImageFilter.SMOOTH_MORE)
+    return layer_img, edge_img
+
+def renderLayer(mask, layer_path, edge_path):
+    layer_img, edge_img = filterLayer(mask)
+    layer_img.save(layer_path)
+    edge_img.save(edge_path)
+
+def colorMasks(img):
+    """Unique colors of an RGB image (packed, sorted) and one 0/255 mask per color.
+
+    All masks are built in a single pass from the per-pixel color index.
+    """
+    import numpy as np
+
+    img_array = np.asarray(img)
+    colors, color_idx = np.unique(biom.packRGB(img_array).ravel(), return_inverse=True)
+    masks = np.zeros((len(colors), color_idx.size), dtype=np.uint8)
+    masks[color_idx, np.arange(color_idx.size)] = 255
+    return colors, masks.reshape(len(colors), *img_array.shape[:2])
+
+def colorIds(colors, ids):
+    """Maps packed palette colors to the IDs painted with them (None if off-palette)."""
+    palette_idx = {}
+    for idx, color in enumerate(biom.packRGB(palette.palettedata_lists).tolist()):
+        palette_idx.setdefault(color, idx)
+    result = []
+    for color in colors.tolist():
+        idx = palette_idx.get(color)
+        result.append(int(ids[idx]) if idx is not None and idx < len(ids) else None)
+    return result
+
+# Bump when layer output changes, so existing layers get regenerated
+LAYER_VERSION = 2
+
+LAYER_FORMATS = ("png", "rgba", "npz")
+
+def layerManifestPath(planet_name):
+    return os.path.join(layers_folder, f"{planet_name}_layers.json")
+
+def readLayerManifest(planet_name):
+    try:
+        with open(layerManifestPath(planet_name)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != LAYER_VERSION:
+        return {}
+    return manifest
+
+def writeLayerManifest(planet_name, manifest):
+    path = layerManifestPath(planet_name)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(dict(manifest, version=LAYER_VERSION), f, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+def renameLayerFiles(renames):
+    """Moves reused layer files to their new names; (old, new) pairs may swap or chain."""
+    staged = []
+    for old, new in renames:
+        tmp = os.path.join(layers_folder, f"{old}.{os.getpid()}.tmp")
+        os.replace(os.path.join(layers_folder, old), tmp)
+        staged.append((tmp, new))
+    for tmp, new in staged:
+        os.replace(tmp, os.path.join(layers_folder, new))
+
+def writePackedLayers(pool, base_name, layer_format, masks):
+    """Renders masks and packs them, 4 per RGBA image or all into one .npz.
+
+    Returns the written file names and, per mask, its (file, channel) location.
+    """
+    import numpy as np
+    from PIL import Image
 
-            unique_img = unique_img.filter(ImageFilter.FIND_EDGES)
-            unique_img = unique_img.filter(ImageFilter.SMOOTH_MORE)
-            unique_img.save(
-                os.path.join(layers_folder, f"{planet_name}_{suffix}_layer{col_idx}_EDGE.png")
-            )
+    rendered = list(pool.map(filterLayer, masks))
+    if layer_format == "npz":
+        file_name = f"{base_name}.npz"
+        np.savez_compressed(
+            os.path.join(layers_folder, file_name),
+            fill=np.stack([np.asarray(fill) for fill, _ in rendered]),
+            edge=np.stack([np.asarray(edge) for _, edge in rendered]),
+        )
+        return [file_name], [(file_name, idx) for idx in range(len(rendered))]
+
+    blank = Image.new("L", (1024, 2048))
+    files, locations, saves = [], [], []
+    for pack_idx in range(0, len(rendered), 4):
+        group = rendered[pack_idx:pack_idx + 4]
+        channels = [fill for fill, _ in group] + [blank] * (4 - len(group))
+        edge_channels = [edge for _, edge in group] + [blank] * (4 - len(group))
+        file_name = f"{base_name}_pack{pack_idx // 4}.png"
+        edge_name = f"{base_name}_pack{pack_idx // 4}_EDGE.png"
+        saves.append(pool.submit(Image.merge("RGBA", channels).save, os.path.join(layers_folder, file_name)))
+        saves.append(pool.submit(Image.merge("RGBA", edge_channels).save, os.path.join(layers_folder, edge_name)))
+        files += [file_name, edge_name]
+        locations += [(file_name, "RGBA"[channel]) for channel in range(len(group))]
+    for future in saves:
+        future.result()
+    return files, locations
+
+@profiling.timed("gen_layers")
+def genLayerImages(planet_name, max_workers=None, force=False, layer_format="png", biome_ids=None):
+    """Writes fill and edge layer images for every color of both planet maps.
+
+    ``layer_format`` is "png" (one grayscale PNG per color), "rgba" (up to
+    four colors packed in the channels of each PNG) or "npz" (one array file
+    per map). A <planet>_layers.json manifest maps every layer to its color,
+    biome/resource ID and file/channel, and records a hash of each color mask
+    so only changed layers (or packs) are re-rendered and files that are no
+    longer produced are removed. Layers are matched to the previous run by
+    color and ID, not by their _layerN number, so a color appearing or
+    disappearing only renames the files of the layers after it. Returns the
+    number of layers rendered.
+    """
+    if layer_format not in LAYER_FORMATS:
+        raise ValueError(f"Unknown layer format '{layer_format}'")
+    ensureFolders()
+
+    with profiling.span("pixels"):
+        biom_img = biom.readImagePixels(planetImage(planet_name, "biomes"))
+        res_img = biom.readImagePixels(planetImage(planet_name, "resources"))
+
+    old_manifest = readLayerManifest(planet_name)
+    if force or old_manifest.get("format") != layer_format:
+        old_layers = {}
+    else:
+        old_layers = {
+            (suffix, layer["color"], layer["id"]): layer
+            for suffix, group in old_manifest["maps"].items()
+            for layer in group
+        }
+    maps = {}
+    files = []
+    rendered = 0
+
+    # PIL releases the GIL while filtering and encoding, so threads scale here
+    # without the cost of spawning processes from inside Blender.
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for suffix, img, ids in (
+            ("biomes", biom_img, biome_ids or ()),
+            ("resources", res_img, biom.KNOWN_RESOURCE_IDS),
+        ):
+            with profiling.span("masks"):
+                colors, masks = colorMasks(img)
+                layers = [
+                    {
+                        "name": f"{planet_name}_{suffix}_layer{col_idx}",
+                        "color": f"#{color:06x}",
+                        "id": layer_id,
+                        "hash": hashlib.blake2b(mask.tobytes(), digest_size=16).hexdigest(),
+                    }
+                    for col_idx, (color, mask, layer_id) in enumerate(zip(colors.tolist(), masks, colorIds(colors, ids)))
+                ]
+                previous = [old_layers.get((suffix, layer["color"], layer["id"])) for layer in layers]
+                unchanged = [
+                    old is not None
+                    and old["hash"] == layer["hash"]
+                    and all(os.path.isfile(os.path.join(layers_folder, f)) for f in old["files"])
+                    for layer, old in zip(layers, previous)
+                ]
+
+            with profiling.span("layers"):
+                if layer_format == "png":
+                    renames = []
+                    for layer, old, skip in zip(layers, previous, unchanged):
+                        layer["files"] = [f"{layer['name']}.png", f"{layer['name']}_EDGE.png"]
+                        if skip:
+                            renames += [(o, n) for o, n in zip(old["files"], layer["files"]) if o != n]
+                    # Before rendering: a changed layer may be written over a reused file's old name
+                    renameLayerFiles(renames)
+
+                    jobs = []
+                    for layer, mask, skip in zip(layers, masks, unchanged):
+                        if not skip:
+                            jobs.append(pool.submit(
+                                renderLayer, mask, *(os.path.join(layers_folder, f) for f in layer["files"])
+                            ))
+                    for future in jobs:
+                        future.result()
+                    rendered += len(jobs)
+                    files += [f for layer in layers for f in layer["files"]]
+                else:
+                    base_name = f"{planet_name}_{suffix}_layers"
+                    # Packs are reused as a whole, only if no layer changed, appeared or disappeared
+                    old_count = sum(1 for key in old_layers if key[0] == suffix)
+                    if all(unchanged) and old_count == len(layers):
+                        locations = [(old["file"], old["channel"]) for old in previous]
+                        group_files = previous[0]["files"]
+                    else:
+                        group_files, locations = writePackedLayers(pool, base_name, layer_format, masks)
+                        rendered += len(layers)
+                    for layer, (file_name, channel) in zip(layers, locations):
+                        layer["file"], layer["channel"] = file_name, channel
+                        layer["files"] = group_files
+                    files += group_files
+            maps[suffix] = layers
+
+    for file_name in set(old_manifest.get("files", ())) - set(files):
+        path = os.path.join(layers_folder, file_name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    writeLayerManifest(planet_name, {"format": layer_format, "maps": maps, "files": sorted(set(files))})
+    profiling.log.info("%s: %d layers rendered", planet_name, rendered)
+    return rendered
+
+def configureLogging(prefs=None):
+    if not any(isinstance(h, logging.StreamHandler) for h in profiling.log.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[SF Planets] %(levelname)s %(message)s"))
+        profiling.log.addHandler(handler)
+
+    if prefs is None:
+        addon = bpy.context.preferences.addons.get(__name__)
+        prefs = addon.preferences if addon else None
+
+    if prefs is not None:
+        profiling.log.setLevel(prefs.log_level)
+        profiling.setTrackMemory(prefs.track_memory)
+    else:
+        profiling.log.setLevel(logging.WARNING)
 
 """
 Register
@@ -600,18 +1189,17 @@ def installModules():
         import PIL
     except ModuleNotFoundError:
         subprocess.run([sys.executable, "-m", "pip", "install", "Pillow"])
-    
-    try:
-        import construct
-    except ModuleNotFoundError:
-        subprocess.run([sys.executable, "-m", "pip", "install", "construct"])
 
-    install_required = False
+    importlib.invalidate_caches()
+    install_required = None
 
 classes = [
     SFPlanetsPreferences,
+    DumpProfileReport,
     InstallMissingSubmodules,
     SetBiomeID,
+    RemapBiomes,
+    RevertPlanetState,
     SaveBiomFile,
     PlanetBiome,
     StarfieldPlanet,
@@ -637,7 +1225,13 @@ def register():
     m.biome_data = CollectionProperty(type=PlanetBiome)
     m.selected_biome = IntProperty(default=0)
 
+    configureLogging()
+
 def unregister():
+    waitForSaves()
+    if bpy.app.timers.is_registered(pollSaves):
+        bpy.app.timers.unregister(pollSaves)
+
     for c in classes:
         bpy.utils.unregister_class(c)
     
@@ -0,0 +1,51 @@
+"""
+Shared plumbing of the batch command lines (no bpy): `python -m biom`,
+`biompatch`, `biomarchive` and `biomstats` all take -v, most take -j, and
+the per-file commands run their work items on a process pool.
+"""
+
+import argparse
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+
+def batchParser(prog, description, jobs=True):
+    """ArgumentParser with the common -v (and -j) options."""
+    parser = argparse.ArgumentParser(prog=prog, description=description)
+    if jobs:
+        parser.add_argument("-j", "--jobs", type=int, default=None,
+                            help="Worker processes (default: CPU count)")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="Log progress (-v) or per-stage diagnostics (-vv)")
+    return parser
+
+
+def setupLogging(verbose):
+    """Logs warnings by default, progress with -v and per-stage diagnostics with -vv."""
+    logging.basicConfig(
+        level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(verbose, 2)],
+        format="%(processName)s %(message)s",
+    )
+
+
+def runBatch(work, jobs=None, report=None):
+    """Runs (fn, args) work items on a process pool; returns the number that failed.
+
+    Items are reported in submission order and named by their first
+    argument: failures with their exception on stderr, successes through
+    report(source, result), or an "OK" line without one.
+    """
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(fn, *fn_args): fn_args[0] for fn, fn_args in work}
+        for future, source in futures.items():
+            error = future.exception()
+            if error is not None:
+                failed += 1
+                print(f"FAILED {source}: {type(error).__name__}: {error}", file=sys.stderr)
+            elif report is not None:
+                report(source, future.result())
+            else:
+                print(f"OK     {source}")
+    return failed
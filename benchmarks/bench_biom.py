@@ -0,0 +1,291 @@
+"""
+Benchmarks for every BiomFile stage on synthetic planets.
+
+Runs without Blender or game data: planets are generated from a seed, and
+__init__.py is imported against a stub ``bpy`` so genLayerImages can be
+timed too. Results are written as JSON so revisions can be compared:
+
+    python benchmarks/bench_biom.py --out before.json
+    python benchmarks/bench_biom.py --out after.json --compare before.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+addon_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if addon_folder not in sys.path:
+    sys.path.append(addon_folder)
+
+import biom
+
+STAGES = ("load", "texture", "imgToArray", "save", "genLayerImages")
+
+# (biome count, resource distribution, noise level)
+DEFAULT_CASES = [
+    (1, "uniform", 0.0),
+    (5, "per_biome", 0.0),
+    (11, "per_biome", 0.05),
+    (11, "uniform", 0.5),
+    (32, "clustered", 0.2),
+]
+
+
+class StubPixels(object):
+    def __init__(self, size):
+        self.data = np.zeros(size, dtype=np.float32)
+
+    def foreach_get(self, out):
+        out[:] = self.data
+
+    def foreach_set(self, values):
+        self.data[:] = values
+
+
+class StubImage(object):
+    """Generated Blender image: just enough for planetImage and the pixel helpers."""
+
+    def __init__(self, name, width, height):
+        self.name = name
+        self.channels = 4
+        self.scale(width, height)
+        self.colorspace_settings = types.SimpleNamespace(name="sRGB")
+
+    def scale(self, width, height):
+        self.size = (width, height)
+        self.pixels = StubPixels(width * height * self.channels)
+
+
+class StubImages(dict):
+    def new(self, name, width, height):
+        image = self[name] = StubImage(name, width, height)
+        return image
+
+
+def stubBpy():
+    """Minimal ``bpy`` module, enough to import the addon's __init__.py."""
+    bpy = types.ModuleType("bpy")
+    prop = lambda *args, **kwargs: (args, kwargs)
+    bpy.props = types.SimpleNamespace(
+        StringProperty=prop, CollectionProperty=prop, IntProperty=prop,
+        BoolProperty=prop, EnumProperty=prop, FloatProperty=prop,
+    )
+    base = type("bpy_struct", (object,), {})
+    bpy.types = types.SimpleNamespace(
+        AddonPreferences=base, UIList=base, PropertyGroup=base, Panel=base,
+        Operator=base, Scene=base, Material=base,
+    )
+    bpy.utils = types.SimpleNamespace(register_class=lambda c: None, unregister_class=lambda c: None)
+    bpy.app = types.SimpleNamespace(timers=types.SimpleNamespace(register=lambda *a, **k: None))
+    bpy.data = types.SimpleNamespace(images=StubImages())
+    bpy.context = types.SimpleNamespace()
+    sys.modules["bpy"] = bpy
+    sys.modules["bpy.types"] = bpy.types
+    sys.modules["bpy.props"] = bpy.props
+    return bpy
+
+
+def importAddon(work_dir):
+    """Imports __init__.py against a stub bpy, with its folders redirected to work_dir."""
+    stubBpy()
+    spec = importlib.util.spec_from_file_location(
+        "sf_planet_experiments", os.path.join(addon_folder, "__init__.py")
+    )
+    addon = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(addon)
+    addon.utils_folder = os.path.join(work_dir, "utils")
+    addon.layers_folder = os.path.join(work_dir, "layers")
+    os.makedirs(addon.utils_folder, exist_ok=True)
+    os.makedirs(addon.layers_folder, exist_ok=True)
+    return addon
+
+
+def smoothField(rng, num_values, cells=8):
+    """Blocky region map: a coarse random grid upsampled to the full grid."""
+    coarse = rng.integers(0, num_values, size=(cells, cells))
+    scale = biom.GRID_SIZE[0] // cells
+    return np.kron(coarse, np.ones((scale, scale), dtype=coarse.dtype)).ravel()
+
+
+def syntheticPlanet(num_biomes, resources, noise, seed=0):
+    """Returns (biomeIds, grids) for a synthetic planet.
+
+    ``resources`` is "uniform" (independent random per cell), "per_biome"
+    (one resource per biome) or "clustered" (smooth regions independent of
+    biomes). ``noise`` is the fraction of cells replaced by random values.
+    """
+    rng = np.random.default_rng(seed)
+    biomeIds = np.sort(rng.choice(np.arange(0x1000, 0x1000000), num_biomes, replace=False)).astype(np.uint32)
+    resourceIds = np.asarray(biom.KNOWN_RESOURCE_IDS, dtype=np.uint8)
+
+    grids = {}
+    for hemisphere in "NS":
+        biomeIdx = smoothField(rng, num_biomes)
+        if resources == "uniform":
+            resrcIdx = rng.integers(0, len(resourceIds), size=biom.GRID_FLATSIZE)
+        elif resources == "per_biome":
+            resrcIdx = biomeIdx % len(resourceIds)
+        elif resources == "clustered":
+            resrcIdx = smoothField(rng, len(resourceIds), cells=16)
+        else:
+            raise ValueError(f"Unknown resource distribution '{resources}'")
+
+        noisy = rng.random(biom.GRID_FLATSIZE) < noise
+        biomeIdx = np.where(noisy, rng.integers(0, num_biomes, size=biom.GRID_FLATSIZE), biomeIdx)
+        resrcIdx = np.where(noisy, rng.integers(0, len(resourceIds), size=biom.GRID_FLATSIZE), resrcIdx)
+
+        grids[f"biomeGrid{hemisphere}"] = biomeIds[biomeIdx]
+        grids[f"resrcGrid{hemisphere}"] = resourceIds[resrcIdx]
+
+    used = np.union1d(grids["biomeGridN"], grids["biomeGridS"])
+    return used, grids
+
+
+def writeSyntheticBiom(filename, num_biomes, resources, noise, seed=0):
+    biomeIds, grids = syntheticPlanet(num_biomes, resources, noise, seed)
+    biom.buildBiom(biomeIds, **grids).tofile(filename)
+
+
+def measure(fn, repeat):
+    """Runs fn repeat times; returns (median wall time, peak traced bytes, last result).
+
+    Timed runs are untraced (tracemalloc adds ~10% overhead); the peak
+    comes from one extra traced run.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), peak, result
+
+
+def benchCase(addon, work_dir, num_biomes, resources, noise, repeat, stages):
+    name = f"synthetic_{num_biomes}_{resources}_{noise:g}"
+    source = os.path.join(work_dir, f"{name}.biom")
+    writeSyntheticBiom(source, num_biomes, resources, noise)
+    results = {}
+
+    def stage(label, fn):
+        if label not in stages:
+            return None
+        wall, peak, result = measure(fn, repeat)
+        results[label] = {"wall_s": wall, "peak_bytes": peak}
+        return result
+
+    def load():
+        planet = biom.BiomFile()
+        planet.load(source)
+        return planet
+
+    planet = stage("load", load) or load()
+    biome_img, res_img = stage("texture", planet.texture) or planet.texture()
+    biome_rgb = np.asarray(biome_img.convert("RGB"))
+    res_rgb = np.asarray(res_img.convert("RGB"))
+
+    def imgToArray():
+        rebuilt = biom.BiomFile()
+        rebuilt.biomeIds = planet.biomeIds
+        rebuilt.imgToArray(biome_rgb, res_rgb)
+        return rebuilt
+
+    stage("imgToArray", imgToArray)
+    stage("save", lambda: planet.save(os.path.join(work_dir, f"{name}_out.biom")))
+
+    biom.writeImagePixels(addon.planetImage(name, "biomes"), biome_img)
+    biom.writeImagePixels(addon.planetImage(name, "resources"), res_img)
+    stage("genLayerImages", lambda: addon.genLayerImages(name, force=True))
+
+    return {
+        "name": name,
+        "biomes": num_biomes,
+        "resources": resources,
+        "noise": noise,
+        "stages": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Returns a list of (case, stage, metric, old, new) regressions beyond tolerance."""
+    old_cases = {case["name"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in current["cases"]:
+        old = old_cases.get(case["name"])
+        if old is None:
+            continue
+        for label, metrics in case["stages"].items():
+            old_metrics = old["stages"].get(label)
+            if old_metrics is None:
+                continue
+            for metric, value in metrics.items():
+                old_value = old_metrics[metric]
+                if old_value and value > old_value * (1 + tolerance):
+                    regressions.append((case["name"], label, metric, old_value, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage, the median is reported")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--label", default="", help="Free-form label stored with the results, e.g. a revision")
+    parser.add_argument("--compare", metavar="BASELINE", help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown/growth vs baseline")
+    args = parser.parse_args(argv)
+
+    stages = set(args.stages.split(","))
+    unknown = stages - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        addon = importAddon(work_dir)
+        cases = [
+            benchCase(addon, work_dir, num_biomes, resources, noise, args.repeat, stages)
+            for num_biomes, resources, noise in DEFAULT_CASES
+        ]
+
+    report = {
+        "label": args.label,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "cases": cases,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, label, metric, old, new in regressions:
+            print(f"REGRESSION {name} {label} {metric}: {old:.6g} -> {new:.6g}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
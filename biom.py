@@ -1,8 +1,7 @@
 from pathlib import Path
-from construct import Struct, Const, Rebuild, this, len_
-from construct import Int32ul as UInt32, Int16ul as UInt16, Int8ul as UInt8
-import csv
+import hashlib
 import numpy as np
+import threading
 import sys
 import os
 from PIL import Image
@@ -10,12 +9,25 @@ from PIL import Image
 dir = os.path.dirname(os.path.realpath(__file__))
 if dir not in sys.path:
 	sys.path.append(dir)
+import batchcli
 import palette
+import planetmesh
+from biomeregistry import BiomeRegistry
+from profiling import log, timed
+import logging
 
 GRID_SIZE = [0x100, 0x100]
 GRID_FLATSIZE = GRID_SIZE[0] * GRID_SIZE[1]
 
-CsSF_Biom = Struct(
+# Reference layout of a .biom file, only used to check biomDtype against in the
+# tests: the addon itself needs no construct package.
+try:
+    from construct import Struct, Const, Rebuild, this, len_
+    from construct import Int32ul as UInt32, Int16ul as UInt16, Int8ul as UInt8
+except ImportError:
+    Struct = None
+
+CsSF_Biom = None if Struct is None else Struct(
     "magic" / Const(0x105, UInt16),
     "_numBiomes" / Rebuild(UInt32, len_(this.biomeIds)),
     "biomeIds" / UInt32[this._numBiomes],
@@ -32,136 +44,782 @@ CsSF_Biom = Struct(
     "resrcGridS" / UInt8[GRID_FLATSIZE],
 )
 
+BIOM_MAGIC = 0x105
+
 KNOWN_RESOURCE_IDS = (8, 88, 0, 80, 1, 81, 2, 82, 3, 83, 4, 84)
 
-with open(Path(__file__).parent.resolve() / "./biomes.csv", newline="") as csvfile:
-    reader = csv.DictReader(csvfile, fieldnames=("edid", "id", "name"))
-    KNOWN_BIOMES = {int(x["id"], 16): (x["edid"], x["name"]) for x in reader}
+
+def biomDtype(numBiomes):
+    """Packed NumPy layout of a whole .biom file, mirroring CsSF_Biom."""
+    return np.dtype([
+        ("magic", "<u2"),
+        ("_numBiomes", "<u4"),
+        ("biomeIds", "<u4", (numBiomes,)),
+        ("_numGrids", "<u4"),
+        ("_gridSizeN", "<u4", (2,)),
+        ("_biomeSizeN", "<u4"),
+        ("biomeGridN", "<u4", (GRID_FLATSIZE,)),
+        ("_resrcSizeN", "<u4"),
+        ("resrcGridN", "u1", (GRID_FLATSIZE,)),
+        ("_gridSizeS", "<u4", (2,)),
+        ("_biomeSizeS", "<u4"),
+        ("biomeGridS", "<u4", (GRID_FLATSIZE,)),
+        ("_resrcSizeS", "<u4"),
+        ("resrcGridS", "u1", (GRID_FLATSIZE,)),
+    ])
+
+
+# Const fields of CsSF_Biom, checked on parse and filled in on build
+BIOM_CONSTS = {
+    "magic": BIOM_MAGIC,
+    "_numGrids": 2,
+    "_gridSizeN": GRID_SIZE,
+    "_biomeSizeN": GRID_FLATSIZE,
+    "_resrcSizeN": GRID_FLATSIZE,
+    "_gridSizeS": GRID_SIZE,
+    "_biomeSizeS": GRID_FLATSIZE,
+    "_resrcSizeS": GRID_FLATSIZE,
+}
+
+
+def readBiomHeader(buffer):
+    """Returns the record dtype for a .biom buffer, checking magic and size."""
+    if len(buffer) < 6:
+        raise ValueError("Truncated .biom header")
+    magic, numBiomes = np.frombuffer(buffer, dtype=np.dtype([("m", "<u2"), ("n", "<u4")]), count=1)[0]
+    if magic != BIOM_MAGIC:
+        raise ValueError(f"Bad .biom magic {magic:#x}, expected {BIOM_MAGIC:#x}")
+    dtype = biomDtype(int(numBiomes))
+    if len(buffer) != dtype.itemsize:
+        raise ValueError(
+            f"Bad .biom size {len(buffer)} for {numBiomes} biomes, expected {dtype.itemsize}"
+        )
+    return dtype
+
+
+def checkBiomConsts(record):
+    for name, expected in BIOM_CONSTS.items():
+        if not np.array_equal(record[name], expected):
+            raise ValueError(f"Bad .biom field {name}: {record[name]}, expected {expected}")
+
+
+def parseBiom(buffer):
+    """Views a .biom buffer as a single structured record, without copying.
+
+    The grid fields of the returned record are views into ``buffer``, so they
+    are writable only when the buffer is (e.g. a bytearray).
+    """
+    dtype = readBiomHeader(buffer)
+    record = np.frombuffer(buffer, dtype=dtype, count=1)[0]
+    checkBiomConsts(record)
+    return record
+
+
+def writeBiomAtomic(filename, data):
+    """Writes encoded .biom bytes so ``filename`` is either the old or the complete new file.
+
+    The data goes to a temporary file next to the target, is fsynced, read
+    back and verified (header parse and checksum) and only then renamed
+    over the target.
+    """
+    data = memoryview(data).cast("B")
+    tmp_path = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(tmp_path, "rb") as f:
+            written = f.read()
+        parseBiom(written)
+        if hashlib.blake2b(written).digest() != hashlib.blake2b(data).digest():
+            raise OSError(f"Verification of '{tmp_path}' failed: checksum mismatch")
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Persist the rename itself where directories can be fsynced
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def buildBiom(biomeIds, biomeGridN, resrcGridN, biomeGridS, resrcGridS):
+    """Packs grids into a .biom record, byte-identical to CsSF_Biom.build."""
+    record = np.zeros((), dtype=biomDtype(len(biomeIds)))
+    for name, value in BIOM_CONSTS.items():
+        record[name] = value
+    record["_numBiomes"] = len(biomeIds)
+    record["biomeIds"] = biomeIds
+    for name, grid in (
+        ("biomeGridN", biomeGridN),
+        ("resrcGridN", resrcGridN),
+        ("biomeGridS", biomeGridS),
+        ("resrcGridS", resrcGridS),
+    ):
+        grid = np.asarray(grid).ravel()
+        assert len(grid) == GRID_FLATSIZE, f"{name} must have {GRID_FLATSIZE} cells"
+        if grid.size and (grid.min() < 0 or grid.max() > np.iinfo(record[name].dtype).max):
+            raise ValueError(f"{name} has values out of range for {record[name].dtype}")
+        record[name] = grid
+    return record
+
+_biome_registry = None
+
+
+def biomeRegistry():
+    """Searchable registry of biomes.csv, built on first use."""
+    global _biome_registry
+    if _biome_registry is None:
+        _biome_registry = BiomeRegistry.fromCsv(Path(__file__).parent.resolve() / "./biomes.csv")
+    return _biome_registry
+
+
+def knownBiomes():
+    """Biome ID -> (EDID, name) from biomes.csv."""
+    registry = biomeRegistry()
+    return {biome_id: registry.get(biome_id) for biome_id in registry.ids}
+
+
+def __getattr__(name):
+    if name == "KNOWN_BIOMES":
+        return knownBiomes()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_biome_names(id):
-    entry = KNOWN_BIOMES.get(id, None)
+    entry = biomeRegistry().get(id, None)
     return entry if entry else (str(id), str(id))
 
 
+def changedRuns(old, new):
+    """(starts, lengths) of the runs of cells where old and new differ."""
+    changed = np.flatnonzero(old != new)
+    if not changed.size:
+        return changed, changed
+    breaks = np.flatnonzero(np.diff(changed) != 1) + 1
+    starts = changed[np.r_[0, breaks]]
+    lengths = np.diff(np.r_[0, breaks, changed.size])
+    return starts, lengths
+
+
+def runPositions(starts, lengths):
+    """Cell positions covered by runs, the inverse of changedRuns."""
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(int(lengths.sum())) + np.repeat(starts - offsets, lengths)
+
+
+def checkBiomeIds(grid, biomeIds):
+    unknown = np.setdiff1d(grid, biomeIds)
+    if unknown.size:
+        raise ValueError(
+            "Biome IDs not in the .biom header table: "
+            + ", ".join(f"{x:08x}" for x in unknown)
+        )
+
+
+def idsToIndices(grid, ids, name="grid", idFormat="08x"):
+    """Maps every cell of ``grid`` to the position of its value in ``ids``.
+
+    Unknown IDs are reported formatted with ``idFormat``: hex form IDs for
+    biome grids, "d" for resource grids.
+    """
+    ids = np.asarray(ids)
+    order = np.argsort(ids, kind="stable")
+    sortedIds = ids[order]
+    grid = np.asarray(grid)
+    pos = np.searchsorted(sortedIds, grid)
+    pos[pos == len(sortedIds)] = 0
+    known = sortedIds[pos] == grid if len(sortedIds) else np.zeros(grid.shape, dtype=bool)
+    if not known.all():
+        unknown, counts = np.unique(grid[~known], return_counts=True)
+        raise ValueError(
+            f"{name} has {int(counts.sum())} cells with unknown IDs: "
+            + ", ".join(f"{x:{idFormat}} ({n} cells)" for x, n in zip(unknown, counts))
+        )
+    return order[pos].astype(np.uint8 if len(ids) <= 0x100 else np.uint32)
+
+
+def remapTable(biomeIds, mapping):
+    """Applies an old -> new biome ID mapping to a biome ID table.
+
+    Returns (table, lut): the new table and, for each position in
+    ``biomeIds``, its position in the new table. Biomes mapped onto the same
+    ID are merged into the entry that comes first, so renames and swaps
+    keep the table order.
+    """
+    newIds = [int(mapping.get(x, x)) for x in biomeIds]
+    table = tuple(dict.fromkeys(newIds))
+    position = {x: i for i, x in enumerate(table)}
+    lut = np.array([position[x] for x in newIds], dtype=np.uint8 if len(table) <= 0x100 else np.uint32)
+    return table, lut
+
+
+def readBiomeMapping(filename):
+    """Reads an old -> new biome ID mapping file.
+
+    One "old,new" pair per line (commas or whitespace); each side is a hex
+    form ID or a biome EDID. Blank lines and # comments are ignored.
+    """
+    registry = biomeRegistry()
+    byEdid = {edid.lower(): id for id, edid in zip(registry.ids, registry.edids)}
+
+    def parseId(value, lineno):
+        try:
+            return int(value, 16)
+        except ValueError:
+            pass
+        if value.lower() in byEdid:
+            return byEdid[value.lower()]
+        raise ValueError(f"{filename}:{lineno}: '{value}' is neither a form ID nor a known EDID")
+
+    mapping = dict()
+    with open(filename, newline="") as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split("#", 1)[0].replace(",", " ").split()
+            if not fields:
+                continue
+            if len(fields) != 2:
+                raise ValueError(f"{filename}:{lineno}: expected 'old,new', got '{line.strip()}'")
+            old, new = (parseId(x, lineno) for x in fields)
+            if mapping.get(old, new) != new:
+                raise ValueError(f"{filename}:{lineno}: {old:08x} is mapped twice")
+            mapping[old] = new
+    return mapping
+
+
+def packRGB(pixels):
+    """Packs the RGB channels of an (..., 3+) array into 24-bit integers."""
+    rgb = np.asarray(pixels)[..., :3].astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def colorsToPaletteIndices(colors):
+    """Index in palette.palettedata of each packed RGB color, -1 if absent."""
+    keys = packRGB(palette.palettedata_lists)
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+    pos = np.searchsorted(sortedKeys, colors)
+    pos[pos == len(sortedKeys)] = 0
+    return np.where(sortedKeys[pos] == colors, order[pos], -1)
+
+
+def paletteIndices(img):
+    """Palette index of every pixel, -1 where the color isn't in the palette.
+
+    'P' images are read from their index plane through a 256-entry table
+    built from the image's own palette, so indexed PNGs re-saved with a
+    reordered palette still decode correctly. Anything else is matched by
+    packed RGB color.
+    """
+    if isinstance(img, Image.Image):
+        if img.mode == "P":
+            own = np.asarray(img.getpalette("RGB") or [], dtype=np.uint8).reshape(-1, 3)
+            lut = np.full(0x100, -1, dtype=np.int64)
+            lut[:len(own)] = colorsToPaletteIndices(packRGB(own))
+            return lut[np.asarray(img)]
+        img = img.convert("RGB")
+    return colorsToPaletteIndices(packRGB(img))
+
+
+def pixelsToIds(img, ids, name="image"):
+    """Maps each pixel of an image painted with palette.palettedata to its ID.
+
+    Only the first len(ids) palette colors are valid; any other color is
+    reported as off-palette with its coordinates.
+    """
+    if len(ids) > len(palette.palettedata_lists):
+        raise ValueError(f"{name}: {len(ids)} IDs but only {len(palette.palettedata_lists)} palette colors")
+    indices = paletteIndices(img)
+    known = (indices >= 0) & (indices < len(ids))
+    if not known.all():
+        ys, xs = np.nonzero(~known)
+        shown = ", ".join(f"({x}, {y})" for x, y in zip(xs[:10], ys[:10]))
+        more = ", ..." if len(xs) > 10 else ""
+        raise ValueError(f"{name} has {len(xs)} off-palette pixels at (x, y): {shown}{more}")
+    return np.asarray(ids)[indices]
+
+
+def splitHemispheres(idGrid):
+    """Splits a 512x256 image-space grid into flat (N, S) .biom grids."""
+    idGrid = np.asarray(idGrid).reshape(2 * GRID_SIZE[0], GRID_SIZE[1])
+    gridS, gridN = idGrid[:GRID_SIZE[0]], idGrid[GRID_SIZE[0]:]
+    return (
+        np.rot90(gridN, axes=(1, 0)).ravel(),
+        np.rot90(gridS, axes=(1, 0)).ravel(),
+    )
+
+
+def indexedImage(idxGrid):
+    """Palette-indexed ('P') image of an index grid using palette.palettedata."""
+    img = Image.fromarray(np.ascontiguousarray(idxGrid, dtype=np.uint8), mode="P")
+    img.putpalette(palette.palettedata)
+    return img
+
+
+def writeImagePixels(image, img):
+    """Copies a PIL image into a Blender-style image via pixels.foreach_set.
+
+    ``image`` only needs ``size``, ``channels``, ``scale()`` and
+    ``pixels.foreach_set``, so a stub object works outside Blender.
+    Blender stores float pixels bottom row first.
+    """
+    width, height = img.size
+    if tuple(image.size) != (width, height):
+        image.scale(width, height)
+    rgba = np.asarray(img.convert('RGBA'), dtype=np.float32)[::-1, :, :image.channels]
+    image.pixels.foreach_set((rgba / 255.0).ravel())
+
+
+def readImagePixels(image):
+    """Reads a Blender-style image into a top-down uint8 RGB array for imgToArray."""
+    width, height = image.size
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(height, width, image.channels)[::-1, :, :3]
+    return np.rint(np.clip(pixels, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+
+def remapImagePixels(image, lut):
+    """Recolors a Blender-style biome image in place by a remapTable() lut.
+
+    Pixels painted with palette color i become color lut[i]; other colors
+    are left alone. Returns the number of pixels changed.
+    """
+    width, height = image.size
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(-1, image.channels)
+    indices = colorsToPaletteIndices(
+        packRGB(np.rint(np.clip(pixels[:, :3], 0.0, 1.0) * 255.0).astype(np.uint8))
+    )
+    full = np.arange(len(palette.palettedata_lists))
+    full[:len(lut)] = lut
+    changed = (indices >= 0) & (full[indices] != indices)
+    count = int(np.count_nonzero(changed))
+    if count:
+        colors = np.asarray(palette.palettedata_lists, dtype=np.float32) / 255.0
+        pixels[changed, :3] = colors[full[indices[changed]]]
+        image.pixels.foreach_set(pixels.ravel())
+    return count
+
+
 class BiomFile(object):
+    """Decoded .biom planet.
+
+    Biome grids are kept as uint8 indices into ``biomeIds`` and resource
+    grids as uint8 resource IDs; ``biomeGridN``/``biomeGridS`` and to_ids()
+    expand them back to full biome IDs on demand. Those expanded grids are
+    read-only copies: edit cells through the index grids, or assign a whole
+    ID grid back to ``biomeGridN``/``biomeGridS``.
+    """
+
+    __slots__ = (
+        "planet_name",
+        "biomeIds",
+        "biomeIdxGridN",
+        "biomeIdxGridS",
+        "resrcGridN",
+        "resrcGridS",
+        "_index",
+    )
+
     def __init__(self):
         self.planet_name = None
-        self.biomeIds = set()
-        self.resourcesPerBiomeId = dict()
-        self.biomeGridN = []
-        self.resrcGridN = []
-        self.biomeGridS = []
-        self.resrcGridS = []
+        self.biomeIds = ()
+        self._index = None
+        self.biomeIdxGridN = np.zeros(GRID_FLATSIZE, dtype=np.uint8)
+        self.biomeIdxGridS = np.zeros(GRID_FLATSIZE, dtype=np.uint8)
+        self.resrcGridN = np.zeros(GRID_FLATSIZE, dtype=np.uint8)
+        self.resrcGridS = np.zeros(GRID_FLATSIZE, dtype=np.uint8)
 
-    def load(self, filename):
-        assert filename.endswith(".biom")
-        with open(filename, "rb") as f:
-            data = CsSF_Biom.parse_stream(f)
-            assert not f.read()
-        self.biomeIds = tuple(data.biomeIds)
-        self.biomeGridN = np.array(data.biomeGridN)
-        self.biomeGridS = np.array(data.biomeGridS)
-        self.resrcGridN = np.array(data.resrcGridN)
-        self.resrcGridS = np.array(data.resrcGridS)
-        resourcesPerBiomeId = {biomeId: set() for biomeId in self.biomeIds}
-        for i, biomeId in enumerate(self.biomeGridN):
-            resourcesPerBiomeId[biomeId].add(self.resrcGridN[i])
-        for i, biomeId in enumerate(self.biomeGridS):
-            resourcesPerBiomeId[biomeId].add(self.resrcGridS[i])
-        self.resourcesPerBiomeId = resourcesPerBiomeId
-        self.biomesDesc = {
+    @staticmethod
+    def readOnly(grid):
+        # Derived grids are fresh copies: writes to them would be silently lost
+        grid.flags.writeable = False
+        return grid
+
+    def expandIds(self, indexGrid):
+        return self.readOnly(np.asarray(self.biomeIds, dtype=np.uint32)[indexGrid])
+
+    @property
+    def biomeGridN(self):
+        return self.expandIds(self.biomeIdxGridN)
+
+    @biomeGridN.setter
+    def biomeGridN(self, grid):
+        self.biomeIdxGridN = idsToIndices(grid, self.biomeIds, "biomeGridN")
+
+    @property
+    def biomeGridS(self):
+        return self.expandIds(self.biomeIdxGridS)
+
+    @biomeGridS.setter
+    def biomeGridS(self, grid):
+        self.biomeIdxGridS = idsToIndices(grid, self.biomeIds, "biomeGridS")
+
+    def to_ids(self):
+        """Full-ID grids, keyed like the CsSF_Biom fields."""
+        return dict(
+            biomeGridN=self.biomeGridN,
+            resrcGridN=self.resrcGridN,
+            biomeGridS=self.biomeGridS,
+            resrcGridS=self.resrcGridS,
+        )
+
+    def invalidate(self):
+        """Drops the cached statistics after in-place edits of the grid arrays."""
+        self._index = None
+
+    def _gridIndex(self):
+        """(biome, resource) co-occurrence index, rebuilt when the grids are replaced.
+
+        In-place edits of the grid arrays are not tracked; reassign the grid
+        or call invalidate() to refresh the statistics.
+        """
+        grids = (self.biomeIdxGridN, self.biomeIdxGridS, self.resrcGridN, self.resrcGridS)
+        cached = self._index
+        if (
+            cached is None
+            or cached[0] != self.biomeIds
+            or any(a is not b for a, b in zip(cached[1], grids))
+        ):
+            pairs = np.concatenate((
+                np.asarray(self.biomeIdxGridN, dtype=np.uint32) << 8 | self.resrcGridN,
+                np.asarray(self.biomeIdxGridS, dtype=np.uint32) << 8 | self.resrcGridS,
+            ))
+            pairs, counts = np.unique(pairs, return_counts=True)
+            biomeIdx, resrc = pairs >> 8, pairs & 0xFF
+            resourceIds = np.unique(resrc)
+            cooccurrence = np.zeros((len(self.biomeIds), len(resourceIds)), dtype=np.int64)
+            cooccurrence[biomeIdx, np.searchsorted(resourceIds, resrc)] = counts
+            cached = (self.biomeIds, grids, tuple(int(x) for x in resourceIds), cooccurrence)
+            self._index = cached
+        return cached[2], cached[3]
+
+    @property
+    def resourceIds(self):
+        """Resource IDs present on the planet, the columns of ``cooccurrence``."""
+        return self._gridIndex()[0]
+
+    @property
+    def cooccurrence(self):
+        """Cell counts per (biome, resource), rows ordered like ``biomeIds``."""
+        return self._gridIndex()[1]
+
+    @property
+    def biomeCounts(self):
+        return dict(zip(self.biomeIds, self.cooccurrence.sum(axis=1).tolist()))
+
+    @property
+    def resourceCounts(self):
+        return dict(zip(self.resourceIds, self.cooccurrence.sum(axis=0).tolist()))
+
+    @property
+    def resourcesPerBiomeId(self):
+        resourceIds, cooccurrence = self._gridIndex()
+        return {
+            biomeId: {resourceIds[i] for i in np.flatnonzero(row)}
+            for biomeId, row in zip(self.biomeIds, cooccurrence)
+        }
+
+    @property
+    def biomeAreaFractions(self):
+        """Fraction of the sphere's surface covered by each biome.
+
+        Cells are weighted by their solid angle under planet.obj's projection
+        (planetmesh.cellSolidAngles, accurate to well under a percent for
+        regions of a few hundred cells).
+        """
+        weights = planetmesh.cellSolidAngles(GRID_SIZE[0])
+        areas = (
+            np.bincount(self.biomeIdxGridN, weights=weights[0], minlength=len(self.biomeIds))
+            + np.bincount(self.biomeIdxGridS, weights=weights[1], minlength=len(self.biomeIds))
+        ) / (4 * np.pi)
+        return dict(zip(self.biomeIds, areas[:len(self.biomeIds)].tolist()))
+
+    @property
+    def resourceAreaFractions(self):
+        """Fraction of the sphere's surface covered by each resource ID present."""
+        weights = planetmesh.cellSolidAngles(GRID_SIZE[0])
+        areas = (
+            np.bincount(self.resrcGridN, weights=weights[0], minlength=0x100)
+            + np.bincount(self.resrcGridS, weights=weights[1], minlength=0x100)
+        ) / (4 * np.pi)
+        return {int(id): float(areas[id]) for id in np.flatnonzero(areas)}
+
+    @property
+    def biomesDesc(self):
+        return {
             "{}_{}".format(get_biome_names(id), id): sorted(value)
             for id, value in self.resourcesPerBiomeId.items()
         }
+
+    @timed("parse")
+    def load(self, filename):
+        assert filename.endswith(".biom")
+        with open(filename, "rb") as f:
+            data = parseBiom(bytearray(f.read()))
+        self.loadRecord(data, Path(filename).stem)
+        log.info("Loaded '%s'.", filename)
+
+    def loadRecord(self, data, planet_name=None):
+        """Decodes a record from parseBiom, copying its grids."""
+        self.biomeIds = tuple(int(x) for x in data["biomeIds"])
+        self.biomeGridN = data["biomeGridN"]
+        self.biomeGridS = data["biomeGridS"]
+        self.resrcGridN = np.array(data["resrcGridN"])
+        self.resrcGridS = np.array(data["resrcGridS"])
+        self.planet_name = planet_name
+
+    @classmethod
+    def open_mmap(cls, filename, mode="r+", offset=0, size=None):
+        """Opens a .biom with its grids as np.memmap views into the file.
+
+        Resource cell edits go straight to disk; call flush() to sync them.
+        The biome grids are mapped read-only (copy-on-write for mode "c")
+        and only change through setBiomes(), which accepts nothing but IDs
+        already in the header table: that table can't grow in place.
+        ``offset``/``size`` locate a .biom stored inside a larger file, such
+        as a planet archive.
+        """
+        if mode not in ("r", "r+", "c"):
+            raise ValueError(f"Unsupported mmap mode '{mode}'")
+        header = parseBiom(np.memmap(
+            filename, dtype=np.uint8, mode="r", offset=offset, shape=None if size is None else (size,)
+        ))
+        dtype = header.dtype
+
+        self = MappedBiomFile()
         self.planet_name = Path(filename).stem
-        print(f"Loaded '{filename}'.")
+        self.biomeIds = tuple(int(x) for x in header["biomeIds"])
+        for name in ("biomeGridN", "resrcGridN", "biomeGridS", "resrcGridS"):
+            fieldType, fieldOffset = dtype.fields[name][:2]
+            openGrid = lambda gridMode: np.memmap(
+                filename, dtype=fieldType.base, mode=gridMode, offset=offset + fieldOffset, shape=fieldType.shape
+            )
+            if not name.startswith("biome"):
+                setattr(self, name, openGrid(mode))
+                continue
+            if mode == "c":
+                writer = openGrid("c")
+                grid = writer.view()
+                grid.flags.writeable = False
+            else:
+                writer = openGrid("r+") if mode == "r+" else None
+                grid = openGrid("r")
+            checkBiomeIds(grid, self.biomeIds)
+            setattr(self, name, grid)
+            self._writers[name] = writer
+        return self
+
+    def flush(self):
+        for grid in self.to_ids().values():
+            if isinstance(grid, np.memmap):
+                grid.flush()
 
+    @timed("build")
     def save(self, filename):
         assert filename.endswith(".biom")
-        obj = dict(
-            biomeIds=sorted(set(self.biomeGridN) | set(self.biomeGridS)),
-            biomeGridN=self.biomeGridN,
-            biomeGridS=self.biomeGridS,
-            resrcGridN=self.resrcGridN,
-            resrcGridS=self.resrcGridS,
-        )
-        
-        assert len(self.biomeGridN) == 0x10000
-        assert len(self.biomeGridS) == 0x10000
-        assert len(self.resrcGridN) == 0x10000
-        assert len(self.resrcGridS) == 0x10000
-        with open(filename, "wb") as f:
-            CsSF_Biom.build_stream(obj, f)
-        print(f"Saved '{filename}'.")
-
-    def imgToArray(self):
-        b2i = {i: id for i, id in enumerate(self.biomeIds)}
-        b2n = {get_biome_names(id): id for id in self.biomeIds}
-        r2i = {i: id for i, id in enumerate(KNOWN_RESOURCE_IDS)}
-
-        print("b2i", b2i)
-        print("b2n", b2n)
-        print("r2i", r2i)
-
-        res_array = np.asarray(self.res_img)
-
-        
-        empty_array = np.zeros((512,256,1))
-        res_array = np.select(
-            [res_array == palette.palettedata_lists[idx] for idx in r2i.keys()],
-            [res_id for res_id in r2i.values()],
-            empty_array
+        used = np.union1d(self.biomeIdxGridN, self.biomeIdxGridS)
+        record = buildBiom(
+            biomeIds=np.sort(np.asarray(self.biomeIds, dtype=np.uint32)[used]),
+            **self.to_ids(),
         )
-        res_array = res_array[:, :, 0:1]
-        res_array = res_array.astype(int)
-        res_array = np.hsplit(res_array.ravel(), (65536,))
+        writeBiomAtomic(filename, record.tobytes())
+        log.info("Saved '%s'.", filename)
 
-        self.resrcGridN = np.rot90(np.reshape(res_array[1], GRID_SIZE), axes=(1,0)).ravel()
-        self.resrcGridS = np.rot90(np.reshape(res_array[0], GRID_SIZE), axes=(1,0)).ravel()
+    @timed("remap")
+    def remapBiomes(self, mapping):
+        """Replaces biome IDs by an old -> new mapping, merging biomes mapped together.
 
-        biom_array = np.asarray(self.biom_img)
+        Both grids go through one lookup table; returns that table (see
+        remapTable) so painted images can be recolored the same way.
+        """
+        table, lut = remapTable(self.biomeIds, mapping)
+        if not np.array_equal(lut, np.arange(len(lut))):
+            self.biomeIdxGridN = lut[self.biomeIdxGridN]
+            self.biomeIdxGridS = lut[self.biomeIdxGridS]
+        self.biomeIds = table
+        return lut
 
-        biom_array = np.select(
-            [biom_array == palette.palettedata_lists[idx] for idx in b2i.keys()],
-            [biom_id for _, biom_id in b2i.items()],
-            empty_array
-        )
-        biom_array = biom_array[:, :, 0:1]
-        biom_array = biom_array.astype(int)
-        biom_array = np.hsplit(biom_array.ravel(), (65536,))
+    @timed("imgToArray")
+    def imgToArray(self, biom_img, res_img):
+        """Reads painted biome/resource images back into the grids.
 
-        self.biomeGridN = np.rot90(np.reshape(biom_array[1], GRID_SIZE), axes=(1,0)).ravel()
-        self.biomeGridS = np.rot90(np.reshape(biom_array[0], GRID_SIZE), axes=(1,0)).ravel()
+        Biome colors are palette indices into the current ``biomeIds``;
+        biomes no longer painted anywhere are dropped from the table.
+        """
+        self.resrcGridN, self.resrcGridS = splitHemispheres(
+            pixelsToIds(res_img, KNOWN_RESOURCE_IDS, "resource image").astype(np.uint8)
+        )
+        biomeIdxGridN, biomeIdxGridS = splitHemispheres(
+            pixelsToIds(biom_img, np.arange(len(self.biomeIds)), "biome image")
+        )
         # Biome IDs
-        unique = np.unique(biom_array)
-        self.biomeIds = tuple([i for i in self.biomeIds if i in unique])
-        print(self.biomeIds)
+        used = np.union1d(biomeIdxGridN, biomeIdxGridS)
+        reindex = np.zeros(max(len(self.biomeIds), 1), dtype=np.uint8)
+        reindex[used] = np.arange(len(used))
+        self.biomeIdxGridN = reindex[biomeIdxGridN]
+        self.biomeIdxGridS = reindex[biomeIdxGridS]
+        self.biomeIds = tuple(self.biomeIds[i] for i in used)
+        log.debug("Biome IDs after imgToArray: %s", self.biomeIds)
 
+    @timed("texture")
     def texture(self):
-        b2i = {id: i for i, id in enumerate(self.biomeIds)}
-        b2n = {id: get_biome_names(id) for id in self.biomeIds}
-        r2i = {id: i for i, id in enumerate(KNOWN_RESOURCE_IDS)}
+        """Returns palette-indexed (biome, resource) images of the grids."""
+
+        biomeIdxGrid = np.hstack((
+            self.biomeIdxGridN.reshape(GRID_SIZE),
+            self.biomeIdxGridS.reshape(GRID_SIZE),
+        ))
+        resIdxGrid = np.hstack((
+            idsToIndices(self.resrcGridN, KNOWN_RESOURCE_IDS, "resrcGridN", "d").reshape(GRID_SIZE),
+            idsToIndices(self.resrcGridS, KNOWN_RESOURCE_IDS, "resrcGridS", "d").reshape(GRID_SIZE),
+        ))
+
+        biome_idx_img = indexedImage(np.rot90(biomeIdxGrid))
+        res_idx_img = indexedImage(np.rot90(resIdxGrid))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Biomes: %s", {id: get_biome_names(id) for id in self.biomeIds})
+            log.debug("Biome colors: %s", biome_idx_img.getcolors())
+            log.debug("Resource colors: %s", res_idx_img.getcolors())
+        return biome_idx_img, res_idx_img
+
+
+class MappedBiomFile(BiomFile):
+    """BiomFile returned by BiomFile.open_mmap, whose biome grids hold full IDs.
+
+    Here the ID grids are read-only views into the file, written through
+    setBiomes(), and the index grids are derived, read-only copies.
+    """
+
+    __slots__ = ("biomeGridN", "biomeGridS", "_writers")
+
+    def __init__(self):
+        self.planet_name = None
+        self.biomeIds = ()
+        self._index = None
+        self._writers = {}
+
+    def setBiomes(self, name, key, ids):
+        """Writes biome IDs to cells ``key`` of the "biomeGridN"/"biomeGridS" grid.
 
-        print(b2n)
+        Raises ValueError, before anything is written, if an ID isn't in the
+        header table or the file was opened read-only.
+        """
+        writer = self._writers[name]
+        if writer is None:
+            raise ValueError("Memory-mapped .biom is opened read-only")
+        checkBiomeIds(np.asarray(ids), self.biomeIds)
+        writer[key] = ids
+        self.invalidate()
 
-        biomeIdxGridN = np.reshape([b2i[x] for x in self.biomeGridN], GRID_SIZE)
-        biomeIdxGridS = np.reshape([b2i[x] for x in self.biomeGridS], GRID_SIZE)
-        resIdxGridN = np.reshape([r2i[x] for x in self.resrcGridN], GRID_SIZE)
-        resIdxGridS = np.reshape([r2i[x] for x in self.resrcGridS], GRID_SIZE)
+    def flush(self):
+        super().flush()
+        for writer in self._writers.values():
+            if writer is not None:
+                writer.flush()
 
-        biomeIdxGrid = np.hstack((biomeIdxGridN, biomeIdxGridS))
-        resIdxGrid = np.hstack((resIdxGridN, resIdxGridS))
+    @property
+    def biomeIdxGridN(self):
+        return self.readOnly(idsToIndices(self.biomeGridN, self.biomeIds, "biomeGridN"))
 
-        combinedGrid = (resIdxGrid + 1) * len(b2i) + biomeIdxGrid * 2
+    @property
+    def biomeIdxGridS(self):
+        return self.readOnly(idsToIndices(self.biomeGridS, self.biomeIds, "biomeGridS"))
+
+    def imgToArray(self, biom_img, res_img):
+        raise TypeError("Memory-mapped .biom files can't be rebuilt from images, use load() instead")
+
+    def remapBiomes(self, mapping):
+        raise TypeError("Memory-mapped .biom files have a fixed biome table, use load() instead")
+
+
+"""
+Batch conversion (no bpy), run as `python -m biom`
+"""
+
+def convertToPng(biom_path, out_dir):
+    biom_file = BiomFile()
+    biom_file.load(str(biom_path))
+    biome_img, res_img = biom_file.texture()
+    name = biom_file.planet_name
+    biome_img.save(os.path.join(out_dir, f"{name}_biomes.png"))
+    res_img.save(os.path.join(out_dir, f"{name}_resources.png"))
+    return name
+
+
+def convertToBiom(biom_path, png_dir, out_dir):
+    name = Path(biom_path).stem
+    biom_file = BiomFile()
+    biom_file.biomeIds = BiomFile.open_mmap(str(biom_path), mode="r").biomeIds
+    biom_img = Image.open(os.path.join(png_dir, f"{name}_biomes.png"))
+    res_img = Image.open(os.path.join(png_dir, f"{name}_resources.png"))
+    biom_file.imgToArray(biom_img, res_img)
+    biom_file.save(os.path.join(out_dir, f"{name}.biom"))
+    return name
+
+
+def remapBiom(biom_path, mapping, out_dir):
+    biom_file = BiomFile()
+    biom_file.load(str(biom_path))
+    biom_file.remapBiomes(mapping)
+    biom_file.save(os.path.join(out_dir, f"{biom_file.planet_name}.biom"))
+    return biom_file.planet_name
+
+
+def main(argv=None):
+    parser = batchcli.batchParser(
+        "python -m biom",
+        "Convert directories of .biom files to biome/resource PNGs and back, or remap their biome IDs.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    to_png = commands.add_parser("to-png", help="Write <planet>_biomes.png and <planet>_resources.png")
+    to_png.add_argument("biom_dir", help="Directory of .biom files")
+    to_png.add_argument("out_dir", help="Directory for the PNGs")
+
+    to_biom = commands.add_parser("to-biom", help="Rebuild .biom files from edited PNGs")
+    to_biom.add_argument("png_dir", help="Directory of <planet>_biomes/_resources.png")
+    to_biom.add_argument("out_dir", help="Directory for the rebuilt .biom files")
+    to_biom.add_argument("--ids-from", required=True, metavar="BIOM_DIR",
+                         help="Directory of the source .biom files, used for their biome ID tables")
+
+    remap = commands.add_parser("remap", help="Replace biome IDs by a mapping file")
+    remap.add_argument("mapping", help="File of 'old,new' form ID or EDID pairs, one per line")
+    remap.add_argument("biom_dir", help="Directory of .biom files")
+    remap.add_argument("out_dir", help="Directory for the remapped .biom files")
+
+    args = parser.parse_args(argv)
+    batchcli.setupLogging(args.verbose)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    if args.command == "to-png":
+        sources = sorted(Path(args.biom_dir).glob("*.biom"))
+        work = [(convertToPng, (str(p), args.out_dir)) for p in sources]
+    elif args.command == "remap":
+        mapping = readBiomeMapping(args.mapping)
+        sources = sorted(Path(args.biom_dir).glob("*.biom"))
+        work = [(remapBiom, (str(p), mapping, args.out_dir)) for p in sources]
+    else:
+        sources = sorted(
+            p for p in Path(args.ids_from).glob("*.biom")
+            if os.path.isfile(os.path.join(args.png_dir, f"{p.stem}_biomes.png"))
+        )
+        work = [(convertToBiom, (str(p), args.png_dir, args.out_dir)) for p in sources]
 
-        biome_idx_img = Image.fromarray(np.uint8(np.rot90(biomeIdxGrid))).convert('LA')
-        biome_idx_img.putpalette(palette.palettedata)
+    failed = batchcli.runBatch(work, args.jobs)
+    print(f"{len(work) - failed}/{len(work)} converted")
+    return 1 if failed else 0
 
-        res_idx_img = Image.fromarray(np.uint8(np.rot90(resIdxGrid))).convert('LA')
-        res_idx_img.putpalette(palette.palettedata)
 
-        self.biome_idx_img = biome_idx_img.convert('RGB')
-        self.res_idx_img = res_idx_img.convert('RGB')
-        print("BIOME COLORS", biome_idx_img.getcolors())
-        print("RES COLORS", self.res_idx_img.getcolors())
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""
+Single-file archives of many .biom planets, run as `python -m biomarchive`.
+
+Layout: a 32-byte header (magic, version, offset and size of the index),
+then every planet as an unmodified CsSF_Biom record, then the index of
+planet name -> (offset, size). Opening reads the header and the index;
+reading a planet is one seek, or an np.memmap of just its bytes.
+
+Adding or replacing a planet appends its record and a new index and only
+then rewrites the header, so an interrupted write leaves the previous
+archive readable. Replaced records stay in the file until compact().
+"""
+
+import os
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import batchcli
+import biom
+from profiling import log, timed
+
+ARCHIVE_MAGIC = b"BIOMARCH"
+ARCHIVE_VERSION = 1
+# magic, version, reserved, index offset, index size
+ARCHIVE_HEADER = struct.Struct("<8sHHIQQ")
+
+
+class BiomArchive(object):
+    """Planet archive opened for reading ("r"), updating ("r+") or created empty ("w")."""
+
+    def __init__(self, filename, mode="r"):
+        if mode not in ("r", "r+", "w"):
+            raise ValueError(f"Unsupported archive mode '{mode}'")
+        self.filename = filename
+        self.mode = mode
+        self.index = dict()
+        # A new archive's empty index may be overwritten by the first records
+        self.fresh = mode == "w"
+        if mode == "w":
+            self.file = open(filename, "w+b")
+            self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, 0, 0, 0))
+            self.writeIndex(ARCHIVE_HEADER.size)
+        else:
+            self.file = open(filename, "rb" if mode == "r" else "r+b")
+            self.readIndex()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def names(self):
+        return list(self.index)
+
+    def readIndex(self):
+        self.file.seek(0)
+        magic, version, _, _, offset, size = ARCHIVE_HEADER.unpack(self.file.read(ARCHIVE_HEADER.size))
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(f"'{self.filename}' is not a .biom archive")
+        if version != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported .biom archive version {version}, expected {ARCHIVE_VERSION}")
+        self.file.seek(offset)
+        data = self.file.read(size)
+        if len(data) != size:
+            raise ValueError(f"Truncated index in '{self.filename}'")
+
+        (count,) = struct.unpack_from("<I", data)
+        pos = 4
+        index = dict()
+        for _ in range(count):
+            (length,) = struct.unpack_from("<H", data, pos)
+            name = data[pos + 2:pos + 2 + length].decode("utf-8")
+            index[name] = struct.unpack_from("<QQ", data, pos + 2 + length)
+            pos += 2 + length + 16
+        self.index = index
+
+    def writeIndex(self, offset):
+        """Writes the index at offset, then points the header at it."""
+        parts = [struct.pack("<I", len(self.index))]
+        for name, (entry_offset, size) in self.index.items():
+            encoded = name.encode("utf-8")
+            parts.append(struct.pack("<H", len(encoded)) + encoded + struct.pack("<QQ", entry_offset, size))
+        data = b"".join(parts)
+
+        self.file.seek(offset)
+        self.file.write(data)
+        self.file.truncate()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        self.file.seek(0)
+        self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, 0, offset, len(data)))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def end(self):
+        self.file.seek(0, os.SEEK_END)
+        return self.file.tell()
+
+    def entry(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise KeyError(f"No planet '{name}' in '{self.filename}'") from None
+
+    def read(self, name):
+        """Raw .biom bytes of a planet."""
+        offset, size = self.entry(name)
+        self.file.seek(offset)
+        return self.file.read(size)
+
+    def record(self, name):
+        """Zero-copy parsed record of a planet, backed by a read-only np.memmap."""
+        offset, size = self.entry(name)
+        return biom.parseBiom(np.memmap(self.filename, dtype=np.uint8, mode="r", offset=offset, shape=(size,)))
+
+    @timed("archive_load")
+    def load(self, name):
+        """Decoded BiomFile of a planet."""
+        biom_file = biom.BiomFile()
+        biom_file.loadRecord(self.record(name), name)
+        return biom_file
+
+    def open_mmap(self, name, mode="r+"):
+        """MappedBiomFile of a planet, editing its cells inside the archive."""
+        if mode == "r+" and self.mode == "r":
+            raise ValueError("Archive is opened read-only")
+        offset, size = self.entry(name)
+        biom_file = biom.BiomFile.open_mmap(self.filename, mode=mode, offset=offset, size=size)
+        biom_file.planet_name = name
+        return biom_file
+
+    def add(self, name, data, replace=False):
+        """Appends a planet's .biom bytes; replace=True overwrites an existing entry."""
+        self.addMany([(name, data)], replace)
+
+    def addMany(self, entries, replace=False):
+        """Appends (name, .biom bytes) pairs with a single index update."""
+        if self.mode == "r":
+            raise ValueError("Archive is opened read-only")
+        entries = list(entries)
+        for name, data in entries:
+            if name in self.index and not replace:
+                raise KeyError(f"Planet '{name}' is already in '{self.filename}'")
+            if len(name.encode("utf-8")) > 0xFFFF:
+                raise ValueError(f"Planet name too long: '{name[:40]}...'")
+            biom.parseBiom(data)
+
+        # New records go after the current index, which stays valid until
+        # the header is rewritten
+        offset = ARCHIVE_HEADER.size if self.fresh else self.end()
+        self.fresh = False
+        self.file.seek(offset)
+        for name, data in entries:
+            self.file.write(data)
+            self.index[name] = (offset, len(data))
+            offset += len(data)
+        self.writeIndex(offset)
+
+    def remove(self, name):
+        if self.mode == "r":
+            raise ValueError("Archive is opened read-only")
+        self.entry(name)
+        del self.index[name]
+        self.writeIndex(self.end())
+
+    def garbage(self):
+        """Bytes taken by replaced/removed records and old indexes."""
+        self.file.seek(0)
+        _, _, _, _, _, index_size = ARCHIVE_HEADER.unpack(self.file.read(ARCHIVE_HEADER.size))
+        used = ARCHIVE_HEADER.size + index_size + sum(size for _, size in self.index.values())
+        return self.end() - used
+
+    def compact(self):
+        """Rewrites the archive without replaced records; the file is swapped in atomically."""
+        if self.mode == "r":
+            raise ValueError("Archive is opened read-only")
+        tmp_path = f"{self.filename}.{os.getpid()}.tmp"
+        try:
+            with BiomArchive(tmp_path, "w") as compacted:
+                compacted.addMany((name, self.read(name)) for name in self.index)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.file.close()
+        os.replace(tmp_path, self.filename)
+        self.file = open(self.filename, "r+b")
+        self.readIndex()
+
+
+@timed("pack")
+def pack(archive_path, biom_paths, replace=True):
+    """Adds .biom files to an archive (created if missing), named by file stem."""
+    mode = "r+" if os.path.isfile(archive_path) else "w"
+    with BiomArchive(archive_path, mode) as archive:
+        entries = []
+        for path in biom_paths:
+            with open(path, "rb") as f:
+                entries.append((Path(path).stem, f.read()))
+        archive.addMany(entries, replace)
+        log.info("Packed %d planets into '%s'.", len(entries), archive_path)
+        return len(entries)
+
+
+@timed("unpack")
+def unpack(archive_path, out_dir, names=None):
+    """Writes planets of an archive back out as loose .biom files."""
+    os.makedirs(out_dir, exist_ok=True)
+    with BiomArchive(archive_path) as archive:
+        names = archive.names() if names is None else names
+        for name in names:
+            biom.writeBiomAtomic(os.path.join(out_dir, f"{name}.biom"), archive.read(name))
+        log.info("Unpacked %d planets from '%s'.", len(names), archive_path)
+        return len(names)
+
+
+def main(argv=None):
+    parser = batchcli.batchParser(
+        "python -m biomarchive",
+        "Pack .biom files into a single indexed archive and back.",
+        jobs=False,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack_cmd = commands.add_parser("pack", help="Add .biom files or directories, replacing planets of the same name")
+    pack_cmd.add_argument("archive")
+    pack_cmd.add_argument("sources", nargs="+", help=".biom files or directories of them")
+
+    unpack_cmd = commands.add_parser("unpack", help="Write planets out as .biom files")
+    unpack_cmd.add_argument("archive")
+    unpack_cmd.add_argument("out_dir")
+    unpack_cmd.add_argument("names", nargs="*", help="Planets to extract (default: all)")
+
+    list_cmd = commands.add_parser("list", help="List planets with their offset and size")
+    list_cmd.add_argument("archive")
+
+    remove_cmd = commands.add_parser("remove", help="Remove planets from the archive")
+    remove_cmd.add_argument("archive")
+    remove_cmd.add_argument("names", nargs="+")
+
+    compact_cmd = commands.add_parser("compact", help="Drop space left by replaced or removed planets")
+    compact_cmd.add_argument("archive")
+
+    args = parser.parse_args(argv)
+    batchcli.setupLogging(args.verbose)
+
+    try:
+        if args.command == "pack":
+            paths = []
+            for source in args.sources:
+                paths += sorted(Path(source).glob("*.biom")) if os.path.isdir(source) else [Path(source)]
+            print(f"{pack(args.archive, paths)} planets packed")
+        elif args.command == "unpack":
+            print(f"{unpack(args.archive, args.out_dir, args.names or None)} planets unpacked")
+        elif args.command == "list":
+            with BiomArchive(args.archive) as archive:
+                for name, (offset, size) in archive.index.items():
+                    print(f"{name}\t{offset}\t{size}")
+                print(f"{len(archive)} planets, {archive.garbage()} bytes reclaimable")
+        elif args.command == "remove":
+            with BiomArchive(args.archive, "r+") as archive:
+                for name in args.names:
+                    archive.remove(name)
+        elif args.command == "compact":
+            with BiomArchive(args.archive, "r+") as archive:
+                before = archive.garbage()
+                archive.compact()
+                print(f"{before} bytes reclaimed")
+    except (OSError, KeyError, ValueError) as e:
+        print(f"FAILED: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
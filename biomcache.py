@@ -0,0 +1,108 @@
+import hashlib
+import os
+
+import numpy as np
+
+import biom
+
+# Bump when the layout of cached entries changes
+CACHE_VERSION = 1
+
+
+class BiomCache(object):
+    """Content-addressed cache of decoded .biom files and their rendered maps.
+
+    Entries are .npz files named by a hash of the .biom contents, so an
+    unchanged planet is reused no matter where it's loaded from. The folder
+    is kept under ``max_bytes`` by evicting least recently used entries.
+    """
+
+    def __init__(self, folder, max_bytes=256 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, filename):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"v{CACHE_VERSION}".encode())
+        with open(filename, "rb") as f:
+            digest.update(f.read())
+        return digest.hexdigest()
+
+    def entryPath(self, key):
+        return os.path.join(self.folder, f"{key}.npz")
+
+    def load(self, filename):
+        """Returns (biom_file, biome_img, res_img) for a .biom, decoding on a miss."""
+        path = self.entryPath(self.key(filename))
+        planet_name = os.path.basename(filename).removesuffix(".biom")
+
+        if os.path.isfile(path):
+            try:
+                with np.load(path) as entry:
+                    biom_file = biom.BiomFile()
+                    biom_file.planet_name = planet_name
+                    biom_file.biomeIds = tuple(int(x) for x in entry["biomeIds"])
+                    biom_file.biomeIdxGridN = entry["biomeIdxGridN"]
+                    biom_file.biomeIdxGridS = entry["biomeIdxGridS"]
+                    biom_file.resrcGridN = entry["resrcGridN"]
+                    biom_file.resrcGridS = entry["resrcGridS"]
+                    biome_img = biom.indexedImage(entry["biomeImage"])
+                    res_img = biom.indexedImage(entry["resrcImage"])
+            except (OSError, KeyError, ValueError):
+                os.remove(path)
+            else:
+                os.utime(path)
+                self.hits += 1
+                return biom_file, biome_img, res_img
+
+        self.misses += 1
+        biom_file = biom.BiomFile()
+        biom_file.load(filename)
+        biome_img, res_img = biom_file.texture()
+        self.store(path, biom_file, biome_img, res_img)
+        return biom_file, biome_img, res_img
+
+    def store(self, path, biom_file, biome_img, res_img):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                biomeIds=np.asarray(biom_file.biomeIds, dtype=np.uint32),
+                biomeIdxGridN=biom_file.biomeIdxGridN,
+                biomeIdxGridS=biom_file.biomeIdxGridS,
+                resrcGridN=biom_file.resrcGridN,
+                resrcGridS=biom_file.resrcGridS,
+                biomeImage=np.asarray(biome_img),
+                resrcImage=np.asarray(res_img),
+            )
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def entries(self):
+        """Cache entries as (path, size, last_used), least recently used first."""
+        if not os.path.isdir(self.folder):
+            return []
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda e: e[2])
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
+        self.hits = 0
+        self.misses = 0
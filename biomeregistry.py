@@ -0,0 +1,180 @@
+import bisect
+import csv
+from collections import defaultdict
+
+import numpy as np
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def editDistance(a, b, limit):
+    """Levenshtein distance of a and b, or limit + 1 once it's known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class BiomeRegistry(object):
+    """Known biomes with a search index over form ID, EDID and display name.
+
+    Every searchable key (lowercased) is kept in a sorted list for prefix
+    lookups and in a trigram index used both to narrow substring matches
+    and to find typo-tolerant candidates, so a query never scans the whole
+    table.
+    """
+
+    def __init__(self, entries):
+        # entries: iterable of (biome_id, edid, name)
+        self.ids = []
+        self.edids = []
+        self.names = []
+        self.byId = dict()
+        for biome_id, edid, name in entries:
+            self.byId[biome_id] = len(self.ids)
+            self.ids.append(biome_id)
+            self.edids.append(edid)
+            self.names.append(name)
+
+        self._prefix = []
+        self._trigrams = defaultdict(set)
+        self._keys = []
+        for index, biome_id in enumerate(self.ids):
+            keys = {
+                f"{biome_id:08x}",
+                f"{biome_id:x}",
+                self.edids[index].lower(),
+                self.names[index].lower(),
+            }
+            keys.update(self.names[index].lower().split())
+            self._keys.append(keys)
+            for key in keys:
+                self._prefix.append((key, index))
+                for gram in trigrams(key):
+                    self._trigrams[gram].add(index)
+        self._prefix.sort()
+
+    @classmethod
+    def fromCsv(cls, filename):
+        """Reads an "edid,form id (hex),name" CSV like biomes.csv."""
+        with open(filename, newline="") as csvfile:
+            reader = csv.DictReader(csvfile, fieldnames=("edid", "id", "name"))
+            return cls((int(x["id"], 16), x["edid"], x["name"]) for x in reader)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, biome_id):
+        return biome_id in self.byId
+
+    def get(self, biome_id, default=None):
+        """(EDID, name) of a biome ID, or default."""
+        index = self.byId.get(biome_id)
+        return default if index is None else (self.edids[index], self.names[index])
+
+    def entry(self, index):
+        return self.ids[index], self.edids[index], self.names[index]
+
+    def prefixMatches(self, query):
+        start = bisect.bisect_left(self._prefix, (query,))
+        matches = set()
+        for key, index in self._prefix[start:]:
+            if not key.startswith(query):
+                break
+            matches.add(index)
+        return matches
+
+    def substringMatches(self, query):
+        if len(query) < 3:
+            candidates = range(len(self.ids))
+        else:
+            # Unpadded grams: the query may sit anywhere inside a key
+            grams = {query[i:i + 3] for i in range(len(query) - 2)}
+            candidates = set.intersection(*(self._trigrams.get(g, set()) for g in grams))
+        return {i for i in candidates if any(query in key for key in self._keys[i])}
+
+    def fuzzyMatches(self, query, max_edits=None):
+        """Indices of entries with a key within max_edits edits of query, with their distance."""
+        if max_edits is None:
+            max_edits = max(1, len(query) // 4)
+        grams = trigrams(query)
+        counts = defaultdict(int)
+        for gram in grams:
+            for index in self._trigrams.get(gram, ()):
+                counts[index] += 1
+        # Each edit changes at most 3 trigrams, so weaker candidates can't match
+        needed = len(grams) - 3 * max_edits
+        matches = dict()
+        for index, count in counts.items():
+            if count < needed:
+                continue
+            distance = min(editDistance(query, key, max_edits) for key in self._keys[index])
+            if distance <= max_edits:
+                matches[index] = distance
+        return matches
+
+    def search(self, query, limit=20):
+        """Entries matching query as (biome_id, edid, name), best first.
+
+        A full form ID returns just that biome. Otherwise every word of the
+        query must match a key, by prefix, substring or within a few typos
+        (ranked in that order); ties keep the table order.
+        """
+        words = query.lower().split()
+        if not words:
+            return [self.entry(i) for i in range(min(limit, len(self.ids)))]
+
+        try:
+            exact = self.byId.get(int(query.strip(), 16))
+        except ValueError:
+            exact = None
+        if exact is not None:
+            return [self.entry(exact)]
+
+        # Every word has to match some key; an entry ranks by its worst word
+        ranked = None
+        for word in words:
+            scores = self.wordMatches(word)
+            if ranked is None:
+                ranked = scores
+            else:
+                ranked = {i: max(ranked[i], scores[i]) for i in ranked.keys() & scores.keys()}
+
+        order = sorted(ranked, key=lambda i: (ranked[i], i))
+        return [self.entry(i) for i in order[:limit]]
+
+    def wordMatches(self, word):
+        """Entry index -> rank for one query word: prefix, substring, then fuzzy."""
+        scores = dict()
+        for index in self.prefixMatches(word):
+            scores[index] = (0, 0)
+        for index in self.substringMatches(word):
+            scores.setdefault(index, (1, 0))
+        if len(word) >= 3:
+            for index, distance in self.fuzzyMatches(word).items():
+                scores.setdefault(index, (2, distance))
+        return scores
+
+    def lookup(self, grid, field="name"):
+        """Vectorized ID -> "name" or "edid" mapping of a whole grid.
+
+        Unknown IDs map to their decimal string, like get_biome_names.
+        """
+        grid = np.asarray(grid)
+        unique, inverse = np.unique(grid, return_inverse=True)
+        column = self.names if field == "name" else self.edids
+        labels = np.array(
+            [column[self.byId[x]] if x in self.byId else str(x) for x in unique.tolist()],
+            dtype=object,
+        )
+        return labels[inverse].reshape(grid.shape)
@@ -0,0 +1,218 @@
+import zlib
+from collections import deque
+
+import numpy as np
+
+import biom
+
+# Snapshot layout: biomeIdxGridN, biomeIdxGridS, resrcGridN, resrcGridS
+GRID_NAMES = ("biomeIdxGridN", "biomeIdxGridS", "resrcGridN", "resrcGridS")
+
+
+def tableLut(fromIds, toIds, missing=0):
+    """Index in ``toIds`` of every entry of ``fromIds``, ``missing`` where absent."""
+    position = {id: i for i, id in enumerate(toIds)}
+    return np.array([position.get(id, missing) for id in fromIds], dtype=np.uint16).reshape(-1)
+
+
+def snapshotState(biom_file):
+    """The grids of a BiomFile as one uint8 array, in GRID_NAMES order."""
+    return np.concatenate([np.asarray(getattr(biom_file, name), dtype=np.uint8) for name in GRID_NAMES])
+
+
+class GridDelta(object):
+    """Changed cells between two consecutive snapshots.
+
+    Cells are compared by biome ID, not by index, so a table that was
+    compacted or reordered doesn't count untouched biomes as changed.
+    Changed positions are stored as runs (start, length) together with the
+    old and new value of every changed cell (indices into ``oldIds`` and
+    ``newIds``), zlib-compressed. With an unchanged table, applying it only
+    touches the changed cells; otherwise the biome grids are reindexed
+    through one lookup table first.
+    """
+
+    __slots__ = ("label", "oldIds", "newIds", "cells", "runs", "blob", "summary")
+
+    def __init__(self, old, new, oldIds, newIds, label=""):
+        self.label = label
+        self.oldIds = tuple(oldIds)
+        self.newIds = tuple(newIds)
+
+        # Old biome indices translated into the new table; removed IDs get a
+        # sentinel that never matches
+        biome = slice(0, 2 * biom.GRID_FLATSIZE)
+        oldInNew = np.array(old, dtype=np.uint16)
+        oldInNew[biome] = tableLut(self.oldIds, self.newIds, missing=0xFFFF)[old[biome]] if self.oldIds else 0xFFFF
+        starts, lengths = biom.changedRuns(oldInNew, new)
+        changed = biom.runPositions(starts, lengths)
+        self.cells = int(changed.size)
+        self.runs = int(starts.size)
+        self.blob = zlib.compress(
+            starts.astype(np.uint32).tobytes()
+            + lengths.astype(np.uint32).tobytes()
+            + old[changed].tobytes()
+            + new[changed].tobytes(),
+            1,
+        )
+        self.summary = self.summarize(changed, old[changed], new[changed])
+
+    @property
+    def nbytes(self):
+        return len(self.blob)
+
+    def decode(self):
+        """Returns (positions, old values, new values) of the changed cells."""
+        payload = np.frombuffer(zlib.decompress(self.blob), dtype=np.uint8)
+        runs = payload[:self.runs * 8].view(np.uint32)
+        positions = biom.runPositions(runs[:self.runs], runs[self.runs:])
+        values = payload[self.runs * 8:]
+        return positions, values[:self.cells], values[self.cells:]
+
+    def summarize(self, positions, old, new):
+        """Cells lost and gained per biome ID and per resource ID."""
+        biome = positions < 2 * biom.GRID_FLATSIZE
+        summary = {"cells": int(positions.size), "biomes": dict(), "resources": dict()}
+        for key, lost, gained in (
+            ("biomes", np.asarray(self.oldIds, dtype=np.uint32)[old[biome]],
+             np.asarray(self.newIds, dtype=np.uint32)[new[biome]]),
+            ("resources", old[~biome], new[~biome]),
+        ):
+            ids, counts = np.unique(lost, return_counts=True)
+            for id, n in zip(ids.tolist(), counts.tolist()):
+                summary[key].setdefault(id, [0, 0])[0] += n
+            ids, counts = np.unique(gained, return_counts=True)
+            for id, n in zip(ids.tolist(), counts.tolist()):
+                summary[key].setdefault(id, [0, 0])[1] += n
+        for id in set(self.oldIds) ^ set(self.newIds):
+            summary["biomes"].setdefault(id, [0, 0])
+        return summary
+
+    def describe(self):
+        """Human-readable lines of the summary, one per changed biome/resource."""
+        lines = [f"{self.label or 'snapshot'}: {self.cells} cells in {self.runs} runs, {self.nbytes} bytes"]
+        for id, (lost, gained) in sorted(self.summary["biomes"].items()):
+            if id not in self.newIds:
+                note = " (removed)"
+            elif id not in self.oldIds:
+                note = " (added)"
+            else:
+                note = ""
+            lines.append(f"  biome {id:08x} {biom.get_biome_names(id)[1]}: -{lost} +{gained}{note}")
+        for id, (lost, gained) in sorted(self.summary["resources"].items()):
+            lines.append(f"  resource {id}: -{lost} +{gained}")
+        return "\n".join(lines)
+
+
+class GridHistory(object):
+    """Undo/redo ring buffer of BiomFile grid snapshots.
+
+    Only the latest snapshot is kept in full; every step before it is a
+    GridDelta. When the deltas outgrow ``max_bytes`` the oldest are dropped.
+    The BiomFile passed to undo()/redo() must be in the state of the
+    current snapshot: push() after every edit.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        self._head = None
+        self._headIds = ()
+        self._undo = deque()
+        self._redo = []
+
+    @property
+    def nbytes(self):
+        head = 0 if self._head is None else self._head.nbytes
+        return head + sum(d.nbytes for d in self._undo) + sum(d.nbytes for d in self._redo)
+
+    @property
+    def canUndo(self):
+        return bool(self._undo)
+
+    @property
+    def canRedo(self):
+        return bool(self._redo)
+
+    def push(self, biom_file, label=""):
+        """Records the current grids of biom_file; returns the new GridDelta, None if unchanged."""
+        state = snapshotState(biom_file)
+        ids = tuple(biom_file.biomeIds)
+        if self._head is None:
+            self._head, self._headIds = state, ids
+            return None
+        if ids == self._headIds and np.array_equal(state, self._head):
+            return None
+
+        delta = GridDelta(self._head, state, self._headIds, ids, label)
+        self._undo.append(delta)
+        self._redo.clear()
+        self._head, self._headIds = state, ids
+        self.evict()
+        return delta
+
+    def evict(self):
+        """Drops the oldest undo steps, then the farthest redo steps, until under max_bytes."""
+        total = self.nbytes
+        while total > self.max_bytes and self._undo:
+            total -= self._undo.popleft().nbytes
+        while total > self.max_bytes and self._redo:
+            total -= self._redo.pop(0).nbytes
+
+    def undo(self, biom_file):
+        """Restores the previous snapshot into biom_file; returns the GridDelta undone, or None."""
+        if not self._undo:
+            return None
+        delta = self._undo.pop()
+        self.apply(biom_file, delta, forward=False)
+        self._redo.append(delta)
+        return delta
+
+    def redo(self, biom_file):
+        """Re-applies the last undone snapshot; returns its GridDelta, or None."""
+        if not self._redo:
+            return None
+        delta = self._redo.pop()
+        self.apply(biom_file, delta, forward=True)
+        self._undo.append(delta)
+        return delta
+
+    def apply(self, biom_file, delta, forward):
+        if isinstance(biom_file, biom.MappedBiomFile):
+            raise TypeError("Memory-mapped .biom files can't be restored in place, use load() instead")
+        if tuple(biom_file.biomeIds) != self._headIds:
+            raise ValueError("BiomFile is not at the current snapshot, push() its edits first")
+
+        positions, old, new = delta.decode()
+        values = new if forward else old
+        fromIds, toIds = (delta.oldIds, delta.newIds) if forward else (delta.newIds, delta.oldIds)
+
+        grids = [getattr(biom_file, name) for name in GRID_NAMES]
+        for i, grid in enumerate(grids):
+            if not grid.flags.writeable:
+                grid = grids[i] = np.array(grid)
+                setattr(biom_file, GRID_NAMES[i], grid)
+
+        if fromIds != toIds:
+            # Cells whose ID is gone are all in the delta and get overwritten below
+            lut = tableLut(fromIds, toIds).astype(np.uint8)
+            biome = slice(0, 2 * biom.GRID_FLATSIZE)
+            self._head[biome] = lut[self._head[biome]]
+            for grid in grids[:2]:
+                np.take(lut, grid, out=grid)
+        self._head[positions] = values
+
+        edges = np.searchsorted(positions, np.arange(len(GRID_NAMES) + 1) * biom.GRID_FLATSIZE)
+        for i, grid in enumerate(grids):
+            cells = slice(edges[i], edges[i + 1])
+            grid[positions[cells] - i * biom.GRID_FLATSIZE] = values[cells]
+
+        self._headIds = delta.newIds if forward else delta.oldIds
+        biom_file.biomeIds = self._headIds
+        biom_file.invalidate()
+
+    def steps(self):
+        """Undo steps, oldest first, then redo steps, nearest first, as GridDelta objects."""
+        return list(self._undo), list(reversed(self._redo))
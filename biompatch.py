@@ -0,0 +1,288 @@
+"""
+Binary diffs between .biom files, run as `python -m biompatch`.
+
+A patch holds the target's biome ID table, as references into the source
+table plus new IDs, and the changed cells of every grid as run-length
+encoded (start, length, values) runs, zlib-compressed. Checksums of both
+files are stored, so a patch is only applied to the file it was made from
+and always reproduces the target byte for byte.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+import batchcli
+import biom
+from profiling import log, timed
+
+PATCH_MAGIC = b"BIOMPTCH"
+PATCH_VERSION = 1
+
+# (field, dtype) of the grids a patch covers, in patch order
+PATCH_GRIDS = (
+    ("biomeGridN", np.dtype("<u4")),
+    ("biomeGridS", np.dtype("<u4")),
+    ("resrcGridN", np.dtype("u1")),
+    ("resrcGridS", np.dtype("u1")),
+)
+
+
+def checksum(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class BiomPatch(object):
+    """Changes turning one .biom file into another."""
+
+    __slots__ = ("sourceChecksum", "targetChecksum", "table", "runs", "summary")
+
+    def __init__(self, sourceChecksum, targetChecksum, table, runs, summary=None):
+        self.sourceChecksum = sourceChecksum
+        self.targetChecksum = targetChecksum
+        # Target biome table: (from_source, value) per entry, value being a
+        # source table position or a new biome ID
+        self.table = table
+        # Grid field -> (starts, lengths, values)
+        self.runs = runs
+        self.summary = summary
+
+    @property
+    def cells(self):
+        return sum(int(lengths.sum()) for _, lengths, _ in self.runs.values())
+
+    def targetTable(self, sourceIds):
+        return np.array(
+            [sourceIds[value] if from_source else value for from_source, value in self.table],
+            dtype=np.uint32,
+        )
+
+    def tobytes(self):
+        parts = [
+            struct.pack("<I", len(self.table)),
+            np.array([f for f, _ in self.table], dtype=np.uint8).tobytes(),
+            np.array([v for _, v in self.table], dtype="<u4").tobytes(),
+        ]
+        for name, dtype in PATCH_GRIDS:
+            starts, lengths, values = self.runs[name]
+            parts += [
+                struct.pack("<I", len(starts)),
+                np.asarray(starts, dtype="<u4").tobytes(),
+                np.asarray(lengths, dtype="<u4").tobytes(),
+                np.asarray(values, dtype=dtype).tobytes(),
+            ]
+        header = PATCH_MAGIC + struct.pack("<H", PATCH_VERSION) + self.sourceChecksum + self.targetChecksum
+        return header + zlib.compress(b"".join(parts), 9)
+
+    @classmethod
+    def frombytes(cls, data):
+        if data[:len(PATCH_MAGIC)] != PATCH_MAGIC:
+            raise ValueError("Not a .biom patch")
+        offset = len(PATCH_MAGIC)
+        (version,) = struct.unpack_from("<H", data, offset)
+        if version != PATCH_VERSION:
+            raise ValueError(f"Unsupported .biom patch version {version}, expected {PATCH_VERSION}")
+        offset += 2
+        sourceChecksum, targetChecksum = data[offset:offset + 16], data[offset + 16:offset + 32]
+        payload = zlib.decompress(data[offset + 32:])
+
+        def take(count, dtype):
+            nonlocal pos
+            values = np.frombuffer(payload, dtype=dtype, count=count, offset=pos)
+            pos += values.nbytes
+            return values
+
+        pos = 0
+        (numIds,) = struct.unpack_from("<I", payload, pos)
+        pos += 4
+        flags = take(numIds, np.uint8)
+        table = [(bool(f), int(v)) for f, v in zip(flags, take(numIds, "<u4"))]
+        runs = dict()
+        for name, dtype in PATCH_GRIDS:
+            (numRuns,) = struct.unpack_from("<I", payload, pos)
+            pos += 4
+            starts = take(numRuns, "<u4")
+            lengths = take(numRuns, "<u4")
+            runs[name] = (starts, lengths, take(int(lengths.sum(dtype=np.int64)), dtype))
+        if pos != len(payload):
+            raise ValueError("Trailing data in .biom patch")
+        return cls(sourceChecksum, targetChecksum, table, runs)
+
+    def describe(self):
+        """Human-readable summary; only available on patches made by diffBiom."""
+        if self.summary is None:
+            return f"{self.cells} cells changed"
+        return describeSummary(self.summary)
+
+
+def summarize(source, target):
+    """Cells lost/gained per biome and resource between two parsed .biom records."""
+    summary = {
+        "cells": 0,
+        "biomes": dict(),
+        "resources": dict(),
+        "biomeIdsAdded": sorted(set(target["biomeIds"].tolist()) - set(source["biomeIds"].tolist())),
+        "biomeIdsRemoved": sorted(set(source["biomeIds"].tolist()) - set(target["biomeIds"].tolist())),
+    }
+    changedCells = np.zeros(biom.GRID_FLATSIZE * 2, dtype=bool)
+    for key, fields in (("biomes", ("biomeGridN", "biomeGridS")), ("resources", ("resrcGridN", "resrcGridS"))):
+        old = np.concatenate([source[f] for f in fields])
+        new = np.concatenate([target[f] for f in fields])
+        changed = old != new
+        changedCells |= changed
+        for column, values in ((0, old[changed]), (1, new[changed])):
+            ids, counts = np.unique(values, return_counts=True)
+            for id, n in zip(ids.tolist(), counts.tolist()):
+                summary[key].setdefault(id, [0, 0])[column] += n
+    summary["cells"] = int(np.count_nonzero(changedCells))
+    return summary
+
+
+def describeSummary(summary):
+    total = biom.GRID_FLATSIZE * 2
+    lines = [f"{summary['cells']} of {total} cells changed ({summary['cells'] / total:.2%})"]
+    for id in summary["biomeIdsAdded"]:
+        lines.append(f"  + biome {id:08x} {biom.get_biome_names(id)[1]}")
+    for id in summary["biomeIdsRemoved"]:
+        lines.append(f"  - biome {id:08x} {biom.get_biome_names(id)[1]}")
+    for id, (lost, gained) in sorted(summary["biomes"].items()):
+        lines.append(f"  biome {id:08x} {biom.get_biome_names(id)[1]}: -{lost} +{gained} cells")
+    for id, (lost, gained) in sorted(summary["resources"].items()):
+        lines.append(f"  resource {id}: -{lost} +{gained} cells")
+    return "\n".join(lines)
+
+
+@timed("diff")
+def diffBiom(source_data, target_data):
+    """Patch turning the .biom bytes source_data into target_data."""
+    source = biom.parseBiom(source_data)
+    target = biom.parseBiom(target_data)
+
+    sourceIds = source["biomeIds"].tolist()
+    position = {id: i for i, id in reversed(list(enumerate(sourceIds)))}
+    table = [
+        (True, position[id]) if id in position else (False, id)
+        for id in target["biomeIds"].tolist()
+    ]
+
+    runs = dict()
+    for name, _ in PATCH_GRIDS:
+        starts, lengths = biom.changedRuns(source[name], target[name])
+        runs[name] = (starts, lengths, target[name][biom.runPositions(starts, lengths)])
+
+    return BiomPatch(
+        checksum(source_data), checksum(target_data), table, runs, summarize(source, target)
+    )
+
+
+@timed("patch")
+def applyPatch(source_data, patch):
+    """Encoded target .biom bytes of a patch applied to source_data."""
+    if checksum(source_data) != patch.sourceChecksum:
+        raise ValueError("Patch was made from a different source .biom")
+    source = biom.parseBiom(source_data)
+
+    grids = dict()
+    for name, _ in PATCH_GRIDS:
+        starts, lengths, values = patch.runs[name]
+        grid = np.array(source[name])
+        grid[biom.runPositions(starts, lengths)] = values
+        grids[name] = grid
+
+    data = biom.buildBiom(patch.targetTable(source["biomeIds"]), **grids).tobytes()
+    if checksum(data) != patch.targetChecksum:
+        raise ValueError("Patched .biom doesn't match the checksum recorded in the patch")
+    return data
+
+
+"""
+Batch diff/patch (no bpy)
+"""
+
+def readBytes(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def diffFiles(source_path, target_path, patch_path):
+    patch = diffBiom(readBytes(source_path), readBytes(target_path))
+    with open(patch_path, "wb") as f:
+        f.write(patch.tobytes())
+    log.info("%s:\n%s", Path(target_path).stem, patch.describe())
+    return patch.summary
+
+
+def patchFile(source_path, patch_path, out_path):
+    patch = BiomPatch.frombytes(readBytes(patch_path))
+    biom.writeBiomAtomic(out_path, applyPatch(readBytes(source_path), patch))
+    return patch.cells
+
+
+def pairFiles(source, other, suffix):
+    """(source file, other file) pairs, matched by planet name for directories."""
+    if os.path.isdir(source):
+        pairs = []
+        for path in sorted(Path(source).glob("*.biom")):
+            match = os.path.join(other, path.stem + suffix)
+            if os.path.isfile(match):
+                pairs.append((str(path), match))
+        return pairs
+    return [(source, other)]
+
+
+def main(argv=None):
+    parser = batchcli.batchParser(
+        "python -m biompatch",
+        "Diff .biom files into compact patches and apply them. "
+        "Arguments may be files or directories of planets matched by name.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    diff = commands.add_parser("diff", help="Write a .biompatch per changed planet and print a summary")
+    diff.add_argument("source", help="Original .biom file or directory")
+    diff.add_argument("target", help="Modified .biom file or directory")
+    diff.add_argument("out", help="Output .biompatch file, or directory for directories")
+
+    apply = commands.add_parser("apply", help="Rebuild modified .biom files from patches")
+    apply.add_argument("source", help="Original .biom file or directory")
+    apply.add_argument("patch", help=".biompatch file or directory")
+    apply.add_argument("out", help="Output .biom file, or directory for directories")
+
+    args = parser.parse_args(argv)
+    batchcli.setupLogging(args.verbose)
+
+    batch = os.path.isdir(args.source)
+    if batch:
+        os.makedirs(args.out, exist_ok=True)
+
+    def outPath(path, suffix):
+        return os.path.join(args.out, Path(path).stem + suffix) if batch else args.out
+
+    if args.command == "diff":
+        work = [
+            (diffFiles, (source, target, outPath(source, ".biompatch")))
+            for source, target in pairFiles(args.source, args.target, ".biom")
+        ]
+    else:
+        work = [
+            (patchFile, (source, patch, outPath(source, ".biom")))
+            for source, patch in pairFiles(args.source, args.patch, ".biompatch")
+        ]
+
+    if args.command == "diff":
+        report = lambda source, summary: print(f"{Path(source).stem}: {describeSummary(summary)}")
+    else:
+        report = lambda source, cells: print(f"OK     {source} ({cells} cells patched)")
+    failed = batchcli.runBatch(work, args.jobs, report)
+
+    print(f"{len(work) - failed}/{len(work)} {'diffed' if args.command == 'diff' else 'patched'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
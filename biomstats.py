@@ -0,0 +1,251 @@
+"""
+Corpus-wide biome/resource statistics, run as `python -m biomstats`.
+
+Walks directories for .biom files (and planets inside .biomarchive files),
+analyzes them in chunks on a process pool and merges the partial counts
+into tables of biome and resource frequencies, biome <-> resource pairings
+and IDs missing from biomes.csv / KNOWN_RESOURCE_IDS. Besides raw cell
+counts, coverage is reported as the mean fraction of planet surface,
+weighted by the solid angle of each cell.
+"""
+
+import csv
+import json
+import os
+import struct
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+import batchcli
+import biom
+import biomarchive
+from profiling import log
+
+
+class CorpusStats(object):
+    """Mergeable counts over a set of planets."""
+
+    def __init__(self):
+        self.planets = 0
+        self.biomeCells = Counter()
+        self.biomePlanets = Counter()
+        self.resourceCells = Counter()
+        self.resourcePlanets = Counter()
+        self.pairCells = Counter()
+        self.pairPlanets = Counter()
+        # Area-weighted coverage, in planet surfaces
+        self.biomeArea = Counter()
+        self.resourceArea = Counter()
+        # ("biome" | "resource", id) -> planet names
+        self.unknown = defaultdict(list)
+        self.failed = dict()
+
+    def add(self, name, biom_file):
+        resourceIds = biom_file.resourceIds
+        cooccurrence = biom_file.cooccurrence
+        biomeRows, resourceCols = np.nonzero(cooccurrence)
+
+        self.planets += 1
+        for id, cells in zip(biom_file.biomeIds, cooccurrence.sum(axis=1).tolist()):
+            if cells:
+                self.biomeCells[id] += cells
+                self.biomePlanets[id] += 1
+        for id, cells in zip(resourceIds, cooccurrence.sum(axis=0).tolist()):
+            self.resourceCells[id] += cells
+            self.resourcePlanets[id] += 1
+        self.biomeArea.update(biom_file.biomeAreaFractions)
+        self.resourceArea.update(biom_file.resourceAreaFractions)
+        for row, col in zip(biomeRows.tolist(), resourceCols.tolist()):
+            pair = (biom_file.biomeIds[row], resourceIds[col])
+            self.pairCells[pair] += int(cooccurrence[row, col])
+            self.pairPlanets[pair] += 1
+
+        registry = biom.biomeRegistry()
+        for id in biom_file.biomeIds:
+            if id not in registry:
+                self.unknown[("biome", id)].append(name)
+        for id in resourceIds:
+            if id not in biom.KNOWN_RESOURCE_IDS:
+                self.unknown[("resource", id)].append(name)
+
+    def merge(self, other):
+        self.planets += other.planets
+        for name in ("biomeCells", "biomePlanets", "resourceCells", "resourcePlanets", "pairCells", "pairPlanets",
+                     "biomeArea", "resourceArea"):
+            getattr(self, name).update(getattr(other, name))
+        for key, names in other.unknown.items():
+            self.unknown[key].extend(names)
+        self.failed.update(other.failed)
+        return self
+
+    def tables(self):
+        """Rows of every output table, as lists of dicts."""
+        registry = biom.biomeRegistry()
+        biomeIds = sorted(self.biomeCells, key=lambda id: -self.biomeCells[id])
+        edids = registry.lookup(np.array(biomeIds, dtype=np.uint32), "edid")
+        names = registry.lookup(np.array(biomeIds, dtype=np.uint32), "name")
+        biomeNames = {id: (edid, name) for id, edid, name in zip(biomeIds, edids, names)}
+        totalBiomes = sum(self.biomeCells.values()) or 1
+        totalResources = sum(self.resourceCells.values()) or 1
+
+        return {
+            "biomes": [
+                {
+                    "biome_id": f"{id:08x}",
+                    "edid": biomeNames[id][0],
+                    "name": biomeNames[id][1],
+                    "cells": self.biomeCells[id],
+                    "fraction": self.biomeCells[id] / totalBiomes,
+                    "area_fraction": self.biomeArea[id] / (self.planets or 1),
+                    "planets": self.biomePlanets[id],
+                }
+                for id in biomeIds
+            ],
+            "resources": [
+                {
+                    "resource_id": id,
+                    "cells": cells,
+                    "fraction": cells / totalResources,
+                    "area_fraction": self.resourceArea[id] / (self.planets or 1),
+                    "planets": self.resourcePlanets[id],
+                }
+                for id, cells in self.resourceCells.most_common()
+            ],
+            "pairs": [
+                {
+                    "biome_id": f"{biomeId:08x}",
+                    "name": biomeNames[biomeId][1],
+                    "resource_id": resourceId,
+                    "cells": cells,
+                    "planets": self.pairPlanets[(biomeId, resourceId)],
+                }
+                for (biomeId, resourceId), cells in sorted(self.pairCells.items())
+            ],
+            "unknown": [
+                {
+                    "kind": kind,
+                    "id": f"{id:08x}" if kind == "biome" else id,
+                    "planets": len(planets),
+                    "planet_names": " ".join(sorted(planets)),
+                }
+                for (kind, id), planets in sorted(self.unknown.items())
+            ],
+            "failed": [{"source": source, "error": error} for source, error in sorted(self.failed.items())],
+        }
+
+
+def findPlanets(sources):
+    """Work items for every planet under the sources: .biom paths and (archive, name) pairs.
+
+    Returns the items and a source -> error dict of missing sources and
+    archives that can't be opened.
+    """
+    items = []
+    failed = dict()
+    for source in sources:
+        if not os.path.exists(source):
+            failed[source] = "FileNotFoundError: No such file or directory"
+            continue
+        paths = sorted(Path(source).rglob("*")) if os.path.isdir(source) else [Path(source)]
+        for path in paths:
+            if path.suffix == ".biom":
+                items.append(str(path))
+            elif path.suffix == ".biomarchive":
+                try:
+                    with biomarchive.BiomArchive(str(path)) as archive:
+                        items += [(str(path), name) for name in archive.names()]
+                except (OSError, ValueError, struct.error) as e:
+                    failed[str(path)] = f"{type(e).__name__}: {e}"
+    return items, failed
+
+
+def analyzeChunk(items):
+    """CorpusStats of a chunk of work items; failures are recorded, not raised."""
+    stats = CorpusStats()
+    archives = dict()
+    try:
+        for item in items:
+            try:
+                if isinstance(item, tuple):
+                    archive_path, name = item
+                    if archive_path not in archives:
+                        archives[archive_path] = biomarchive.BiomArchive(archive_path)
+                    biom_file = archives[archive_path].load(name)
+                    source = f"{archive_path}:{name}"
+                else:
+                    biom_file = biom.BiomFile()
+                    biom_file.load(item)
+                    source = item
+                stats.add(source, biom_file)
+            except (OSError, ValueError, KeyError, AssertionError) as e:
+                stats.failed[str(item)] = f"{type(e).__name__}: {e}"
+    finally:
+        for archive in archives.values():
+            archive.close()
+    return stats
+
+
+def analyze(sources, jobs=None, chunk_size=32):
+    items, failed = findPlanets(sources)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    stats = CorpusStats()
+    stats.failed.update(failed)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for future in as_completed([pool.submit(analyzeChunk, chunk) for chunk in chunks]):
+            stats.merge(future.result())
+            log.info("%d/%d planets analyzed", stats.planets + len(stats.failed) - len(failed), len(items))
+    return stats
+
+
+def writeCsv(tables, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, rows in tables.items():
+        with open(os.path.join(out_dir, f"{name}.csv"), "w", newline="") as f:
+            if not rows:
+                continue
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = batchcli.batchParser(
+        "python -m biomstats",
+        "Biome and resource statistics over directories of .biom files and archives.",
+    )
+    parser.add_argument("sources", nargs="+", help="Directories (searched recursively), .biom or .biomarchive files")
+    parser.add_argument("--chunk", type=int, default=32, help="Planets per work item")
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("-o", "--out",
+                        help="JSON file (default: stdout), or directory for one CSV per table")
+    args = parser.parse_args(argv)
+    batchcli.setupLogging(args.verbose)
+    if args.format == "csv" and not args.out:
+        parser.error("--format csv needs --out DIR")
+
+    stats = analyze(args.sources, args.jobs, max(args.chunk, 1))
+    tables = stats.tables()
+    if args.format == "csv":
+        writeCsv(tables, args.out)
+    else:
+        text = json.dumps({"planets": stats.planets, **tables}, indent=2)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(text)
+        else:
+            print(text)
+
+    print(
+        f"{stats.planets} planets, {len(stats.biomeCells)} biomes, {len(stats.resourceCells)} resources, "
+        f"{len(stats.unknown)} unknown IDs, {len(stats.failed)} failed",
+        file=sys.stderr,
+    )
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
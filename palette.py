@@ -1,40 +1,8 @@
+import numpy as np
 
-palettedata = [
-     68,   1,  84,
-     72,  33, 114,
-     66,  61, 132,
-     56,  87, 140,
-     45, 111, 142,
-     36, 133, 141,
-     30, 154, 137,
-     42, 176, 126,
-     81, 196, 104,
-    134, 212,  73,
-    194, 223,  34,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-    253, 231,  36,
-]
-
-palettedata_lists = [
+# Original hand-picked colors. Existing planet images are painted with these,
+# so they keep indices 0-11; the rest of the palette is generated from them.
+base_palette = [
     [ 68,   1,  84],
     [ 72,  33, 114],
     [ 66,  61, 132],
@@ -47,24 +15,51 @@ palettedata_lists = [
     [134, 212,  73],
     [194, 223,  34],
     [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-    [253, 231,  36],
-]
\ No newline at end of file
+]
+
+PALETTE_SIZE = 256
+
+
+def srgbToLab(rgb):
+    """CIELAB (D65) coordinates of 8-bit sRGB colors, shape (..., 3)."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = c @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ]) / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack((
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ), axis=-1)
+
+
+def generatePalette(size=PALETTE_SIZE, base=base_palette, levels=16):
+    """Extends ``base`` to ``size`` colors by greedy farthest-point sampling.
+
+    Each new color is the candidate (from a levels^3 RGB grid) farthest in
+    CIELAB from every color picked so far, so all entries stay distinct and
+    as far apart as the grid allows.
+    """
+    steps = np.rint(np.linspace(0, 255, levels)).astype(np.int64)
+    candidates = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+    candidate_lab = srgbToLab(candidates)
+
+    colors = [list(c) for c in base[:size]]
+    base_lab = srgbToLab(colors)
+    min_dist = np.min(
+        np.linalg.norm(candidate_lab[:, None, :] - base_lab[None, :, :], axis=-1), axis=1
+    )
+    while len(colors) < size:
+        pick = int(np.argmax(min_dist))
+        colors.append([int(c) for c in candidates[pick]])
+        min_dist = np.minimum(min_dist, np.linalg.norm(candidate_lab - candidate_lab[pick], axis=-1))
+    return colors
+
+
+palettedata_lists = generatePalette()
+
+palettedata = [c for color in palettedata_lists for c in color]
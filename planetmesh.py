@@ -0,0 +1,218 @@
+"""
+Procedural planet sphere matching the 512x256 biome/resource image layout.
+
+The image holds two square hemisphere maps: south on top (UV v in 0.5-1)
+and north below (v in 0-0.5). Each square is wrapped onto its hemisphere
+like the UVs of the planet.obj shipped with earlier versions: the pole sits
+in the middle of the square and the equator runs along its border. No bpy
+here, so it can be used and checked outside Blender.
+
+planet.obj follows no exact closed form, so the square -> hemisphere
+mapping is a table sampled from it (see OBJ_DISK_OCTANT). Against the old
+mesh's vertex/UV pairs the interpolated directions are off by 0.10 degrees
+on average, 0.30 at the 95th percentile and 0.62 at most.
+"""
+
+import functools
+
+import numpy as np
+
+
+# planet.obj's square -> disk mapping on a 33x33 lattice over [-1, 1]^2,
+# where a disk point at radius r and angle t is the direction r * 90 degrees
+# from the pole (azimuthal equidistant). Sampled by interpolating the obj's
+# triangles at every lattice point, then averaged over both hemispheres and
+# the eight symmetries of the square, which the obj follows to within its
+# noise. Only lattice points with a >= b >= 0 are stored: row i holds
+# a = i / 16 and b = 0 .. i / 16; the border (row 16) is exactly on the
+# unit circle.
+OBJ_DISK_OCTANT = (
+    ((0.0000, 0.0000),),
+    ((0.0456, 0.0000), (0.0465, 0.0465)),
+    ((0.1137, 0.0000), (0.1124, 0.0527), (0.1106, 0.1106)),
+    ((0.1824, 0.0000), (0.1801, 0.0548), (0.1743, 0.1104), (0.1683, 0.1683)),
+    ((0.2472, 0.0000), (0.2451, 0.0543), (0.2388, 0.1090), (0.2309, 0.1649), (0.2218, 0.2218)),
+    ((0.3118, 0.0000), (0.3097, 0.0534), (0.3035, 0.1070), (0.2940, 0.1600), (0.2846, 0.2158),
+     (0.2723, 0.2723)),
+    ((0.3771, 0.0000), (0.3756, 0.0522), (0.3693, 0.1040), (0.3606, 0.1559), (0.3485, 0.2077),
+     (0.3357, 0.2634), (0.3200, 0.3200)),
+    ((0.4446, 0.0000), (0.4433, 0.0504), (0.4377, 0.1008), (0.4289, 0.1513), (0.4165, 0.2011),
+     (0.4015, 0.2526), (0.3838, 0.3073), (0.3633, 0.3633)),
+    ((0.5119, 0.0000), (0.5104, 0.0488), (0.5055, 0.0971), (0.4971, 0.1456), (0.4854, 0.1939),
+     (0.4702, 0.2420), (0.4519, 0.2933), (0.4292, 0.3482), (0.4039, 0.4039)),
+    ((0.5769, 0.0000), (0.5758, 0.0472), (0.5717, 0.0940), (0.5643, 0.1407), (0.5533, 0.1876),
+     (0.5387, 0.2336), (0.5206, 0.2800), (0.4984, 0.3305), (0.4707, 0.3849), (0.4414, 0.4414)),
+    ((0.6379, 0.0000), (0.6370, 0.0460), (0.6336, 0.0917), (0.6274, 0.1371), (0.6178, 0.1822),
+     (0.6050, 0.2269), (0.5887, 0.2712), (0.5689, 0.3163), (0.5436, 0.3672), (0.5118, 0.4223),
+     (0.4814, 0.4814)),
+    ((0.6936, 0.0000), (0.6932, 0.0457), (0.6908, 0.0913), (0.6857, 0.1366), (0.6777, 0.1813),
+     (0.6669, 0.2256), (0.6538, 0.2690), (0.6376, 0.3119), (0.6177, 0.3569), (0.5910, 0.4099),
+     (0.5580, 0.4666), (0.5275, 0.5275)),
+    ((0.7459, 0.0000), (0.7456, 0.0461), (0.7442, 0.0921), (0.7404, 0.1380), (0.7338, 0.1834),
+     (0.7252, 0.2281), (0.7147, 0.2718), (0.7019, 0.3150), (0.6865, 0.3587), (0.6662, 0.4066),
+     (0.6378, 0.4608), (0.6047, 0.5164), (0.5769, 0.5769)),
+    ((0.8013, 0.0000), (0.8014, 0.0482), (0.8001, 0.0966), (0.7961, 0.1451), (0.7899, 0.1931),
+     (0.7824, 0.2400), (0.7734, 0.2858), (0.7629, 0.3309), (0.7502, 0.3762), (0.7336, 0.4227),
+     (0.7099, 0.4718), (0.6803, 0.5210), (0.6492, 0.5702), (0.6241, 0.6241)),
+    ((0.8616, 0.0000), (0.8612, 0.0525), (0.8587, 0.1050), (0.8535, 0.1575), (0.8467, 0.2088),
+     (0.8392, 0.2579), (0.8306, 0.3056), (0.8199, 0.3525), (0.8062, 0.3985), (0.7883, 0.4439),
+     (0.7658, 0.4878), (0.7396, 0.5305), (0.7111, 0.5724), (0.6831, 0.6149), (0.6595, 0.6595)),
+    ((0.9282, 0.0000), (0.9274, 0.0570), (0.9232, 0.1139), (0.9165, 0.1699), (0.9075, 0.2243),
+     (0.8972, 0.2759), (0.8851, 0.3256), (0.8703, 0.3737), (0.8528, 0.4203), (0.8322, 0.4642),
+     (0.8100, 0.5045), (0.7864, 0.5421), (0.7611, 0.5782), (0.7357, 0.6143), (0.7115, 0.6522),
+     (0.6888, 0.6888)),
+    ((1.0000, 0.0000), (0.9981, 0.0611), (0.9926, 0.1218), (0.9833, 0.1820), (0.9703, 0.2419),
+     (0.9555, 0.2950), (0.9386, 0.3450), (0.9190, 0.3943), (0.8969, 0.4423), (0.8723, 0.4890),
+     (0.8509, 0.5253), (0.8299, 0.5579), (0.8078, 0.5895), (0.7844, 0.6203), (0.7597, 0.6502),
+     (0.7340, 0.6792), (0.7071, 0.7071)),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def diskTable():
+    """OBJ_DISK_OCTANT unfolded into the full read-only (33, 33, 2) lattice, indexed by a then b."""
+    n = len(OBJ_DISK_OCTANT) - 1
+    quadrant = np.zeros((n + 1, n + 1, 2))
+    for i, row in enumerate(OBJ_DISK_OCTANT):
+        for j, (u, v) in enumerate(row):
+            quadrant[i, j] = (u, v)
+            quadrant[j, i] = (v, u)
+    steps = np.arange(-n, n + 1)
+    signs = np.where(steps < 0, -1.0, 1.0)
+    table = quadrant[np.abs(steps)][:, np.abs(steps)]
+    table[..., 0] *= signs[:, None]
+    table[..., 1] *= signs[None, :]
+    table.flags.writeable = False
+    return table
+
+
+def squareToDisk(a, b):
+    """planet.obj's mapping of [-1, 1]^2 onto the unit disk, bilinear between diskTable() points."""
+    table = diskTable()
+    last = table.shape[0] - 1
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    x = (a + 1) * (last / 2)
+    y = (b + 1) * (last / 2)
+    i = np.clip(np.floor(x).astype(np.intp), 0, last - 1)
+    j = np.clip(np.floor(y).astype(np.intp), 0, last - 1)
+    fx = (x - i)[..., None]
+    fy = (y - j)[..., None]
+    disk = (
+        table[i, j] * ((1 - fx) * (1 - fy))
+        + table[i + 1, j] * (fx * (1 - fy))
+        + table[i, j + 1] * ((1 - fx) * fy)
+        + table[i + 1, j + 1] * (fx * fy)
+    )
+    # Between lattice points the border would follow a chord: push it back onto the equator
+    rim = np.maximum(np.abs(a), np.abs(b)) >= 1
+    disk /= np.where(rim, np.hypot(disk[..., 0], disk[..., 1]), 1.0)[..., None]
+    return disk[..., 0], disk[..., 1]
+
+
+def hemisphereDirections(a, b, north=True):
+    """Unit vectors (Blender axes, +Z north) for square coordinates in [-1, 1]^2."""
+    u, v = squareToDisk(a, b)
+    r = np.hypot(u, v)
+    theta = r * (np.pi / 2)
+    safe_r = np.where(r > 0, r, 1)
+    cos_a = np.where(r > 0, u / safe_r, 1)
+    sin_a = np.where(r > 0, v / safe_r, 0)
+    sin_t = np.sin(theta)
+    if north:
+        return np.stack((-sin_t * cos_a, -sin_t * sin_a, np.cos(theta)), axis=-1)
+    return np.stack((-sin_t * cos_a, sin_t * sin_a, -np.cos(theta)), axis=-1)
+
+
+def hemisphereUVs(a, b, north=True):
+    """Texture coordinates of square coordinates in the 512x256 N/S layout."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    v = (b + 1) / 4
+    return np.stack(((a + 1) / 2, v if north else v + 0.5), axis=-1)
+
+
+def planetMeshData(subdivisions=64):
+    """Vertices, quad faces and per-loop UVs of a unit planet sphere.
+
+    Each hemisphere is a ``subdivisions`` x ``subdivisions`` quad grid;
+    equator vertices are shared between the two. Returns (verts (V, 3)
+    float32, faces (F, 4) int32, loop_uvs (F * 4, 2) float32), with faces
+    wound so their normals point outward.
+    """
+    n = int(subdivisions)
+    if n < 1:
+        raise ValueError("subdivisions must be at least 1")
+    steps = np.linspace(-1.0, 1.0, n + 1)
+    a, b = np.meshgrid(steps, steps, indexing="ij")
+
+    grid = np.arange((n + 1) ** 2).reshape(n + 1, n + 1)
+    quads = np.stack((grid[:-1, :-1], grid[1:, :-1], grid[1:, 1:], grid[:-1, 1:]), axis=-1).reshape(-1, 4)
+
+    positions, uvs, faces = [], [], []
+    for half, north in enumerate((True, False)):
+        positions.append(hemisphereDirections(a, b, north).reshape(-1, 3))
+        uvs.append(hemisphereUVs(a, b, north).reshape(-1, 2))
+        faces.append(quads + half * (n + 1) ** 2)
+    positions = np.concatenate(positions)
+    uvs = np.concatenate(uvs)
+    faces = np.concatenate(faces)
+
+    # Outward winding: the quad normal must agree with its center direction
+    corners = positions[faces]
+    normals = np.cross(corners[:, 2] - corners[:, 0], corners[:, 3] - corners[:, 1])
+    inward = np.einsum("ij,ij->i", normals, corners.mean(axis=1)) < 0
+    faces[inward] = faces[inward][:, ::-1]
+
+    loop_uvs = uvs[faces].reshape(-1, 2)
+
+    # Merge the equator, where both hemispheres produce the same points
+    _, first, remap = np.unique(
+        np.round(positions, 6), axis=0, return_index=True, return_inverse=True
+    )
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    verts = positions[first[order]]
+    faces = rank[remap.ravel()][faces]
+
+    return verts.astype(np.float32), faces.astype(np.int32), loop_uvs.astype(np.float32)
+
+
+def triangleSolidAngle(a, b, c):
+    """Solid angle of spherical triangles with unit vertex vectors (Van Oosterom-Strackee)."""
+    numerator = np.abs(np.einsum("...i,...i->...", a, np.cross(b, c)))
+    denominator = (
+        1
+        + np.einsum("...i,...i->...", a, b)
+        + np.einsum("...i,...i->...", b, c)
+        + np.einsum("...i,...i->...", c, a)
+    )
+    return 2 * np.arctan2(numerator, denominator)
+
+
+@functools.lru_cache(maxsize=None)
+def cellSolidAngles(size=256):
+    """Solid angle of every cell of the N and S grids, in steradians.
+
+    Returns a read-only (2, size * size) array, N first, cells in flat grid
+    order; a grid cell (i, j) spans square coordinates a and b of pixel
+    column i and row j of its hemisphere image. The whole table sums to
+    4 pi. Computed once per process and shared by all planets.
+
+    Cells follow planet.obj's projection through squareToDisk(). Compared
+    with cells cut directly from the obj's triangles, single cells differ
+    by 3.5% on average (the obj is faceted, the table smooth), but any
+    16x16 block of cells is within 2.8% and 0.35% on average, so the area
+    of a biome region is accurate to well under a percent.
+    """
+    edges = np.linspace(-1.0, 1.0, size + 1)
+    a, b = np.meshgrid(edges, edges, indexing="ij")
+    table = np.empty((2, size * size))
+    for half, north in enumerate((True, False)):
+        corners = hemisphereDirections(a, b, north)
+        p00, p10 = corners[:-1, :-1], corners[1:, :-1]
+        p11, p01 = corners[1:, 1:], corners[:-1, 1:]
+        table[half] = (triangleSolidAngle(p00, p10, p11) + triangleSolidAngle(p00, p11, p01)).ravel()
+    table.flags.writeable = False
+    return table
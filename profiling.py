@@ -0,0 +1,107 @@
+import functools
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+log = logging.getLogger("sf_planets")
+
+# Span path -> [calls, total seconds, max seconds, max peak bytes]
+PROFILE = dict()
+
+track_memory = False
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _threadStack():
+    """Open spans of the calling thread, so worker threads nest on their own."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def setTrackMemory(enabled):
+    """Turns tracemalloc peak tracking of spans on or off."""
+    global track_memory
+    track_memory = enabled
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def span(name):
+    """Times a stage and records it under its nesting path, e.g. "load/parse".
+
+    With memory tracking on, the peak traced allocation above the level at
+    span entry is recorded too (nested spans propagate their peaks upward).
+    tracemalloc is process-wide, so peaks of spans overlapping with other
+    threads include their allocations.
+    """
+    stack = _threadStack()
+    path = f"{stack[-1][0]}/{name}" if stack else name
+    tracing = track_memory and tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][2] = max(stack[-1][2], peak)
+        tracemalloc.reset_peak()
+    else:
+        current = 0
+    frame = [path, current, 0]
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        peak = 0
+        if tracing and tracemalloc.is_tracing():
+            absolute = max(tracemalloc.get_traced_memory()[1], frame[2])
+            peak = absolute - frame[1]
+            if stack:
+                stack[-1][2] = max(stack[-1][2], absolute)
+        with _lock:
+            entry = PROFILE.setdefault(path, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            entry[3] = max(entry[3], peak)
+        if peak:
+            log.debug("%s: %.1f ms, peak %.1f MiB", path, elapsed * 1000, peak / 2**20)
+        else:
+            log.debug("%s: %.1f ms", path, elapsed * 1000)
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def report():
+    """Per-span profile table, in the order spans were first seen."""
+    lines = [f"{'span':<40} {'calls':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'peak MiB':>9}"]
+    with _lock:
+        rows = [(path, *entry) for path, entry in PROFILE.items()]
+    for path, calls, total, longest, peak in rows:
+        lines.append(
+            f"{path:<40} {calls:>6} {total * 1000:>10.1f} {total * 1000 / calls:>9.1f}"
+            f" {longest * 1000:>9.1f} {peak / 2**20:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def reset():
+    with _lock:
+        PROFILE.clear()
@@ -0,0 +1,15 @@
+"""
+pytest plugin (see pytest.ini): the repo root is the Blender addon package,
+which only imports inside Blender, so it is collected as a plain directory.
+"""
+
+from pathlib import Path
+
+import pytest
+
+repo_folder = Path(__file__).resolve().parent.parent
+
+
+def pytest_collect_directory(path, parent):
+    if path == repo_folder:
+        return pytest.Dir.from_parent(parent, path=path)
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if repo_folder not in sys.path:
+    sys.path.insert(0, repo_folder)
+
+import biom
+
+
+def syntheticGrids(biomeIds, seed=0, cells=8):
+    """Blocky biome/resource grids over biomeIds, like a painted planet."""
+    rng = np.random.default_rng(seed)
+    biomeIds = np.asarray(biomeIds, dtype=np.uint32)
+    resourceIds = np.asarray(biom.KNOWN_RESOURCE_IDS, dtype=np.uint8)
+    scale = biom.GRID_SIZE[0] // cells
+    block = np.ones((scale, scale), dtype=np.intp)
+    grids = {}
+    for hemisphere in "NS":
+        biomeIdx = np.kron(rng.integers(0, len(biomeIds), size=(cells, cells)), block).ravel()
+        resrcIdx = np.kron(rng.integers(0, len(resourceIds), size=(cells, cells)), block).ravel()
+        grids[f"biomeGrid{hemisphere}"] = biomeIds[biomeIdx]
+        grids[f"resrcGrid{hemisphere}"] = resourceIds[resrcIdx]
+    # Every biome painted somewhere, so save() keeps the whole table
+    grids["biomeGridN"][:len(biomeIds)] = biomeIds
+    return grids
+
+
+def syntheticBiom(biomeIds, seed=0):
+    """Encoded .biom bytes of a synthetic planet; biomeIds should be sorted, as save() writes them."""
+    return biom.buildBiom(np.asarray(biomeIds, dtype=np.uint32), **syntheticGrids(biomeIds, seed)).tobytes()
+
+
+@pytest.fixture
+def planet():
+    return syntheticBiom([0x1234, 0x5678, 0x9ABC, 0x100000])
+
+
+@pytest.fixture
+def writePlanet(tmp_path):
+    def write(data, name="planet"):
+        path = tmp_path / f"{name}.biom"
+        path.write_bytes(data)
+        return str(path)
+    return write
@@ -0,0 +1,210 @@
+import io
+
+import numpy as np
+import pytest
+
+import biom
+from conftest import syntheticBiom, syntheticGrids
+
+
+def test_buildBiom_matches_construct_layout():
+    pytest.importorskip("construct")
+    biomeIds = [0x1234, 0x5678, 0x9ABC]
+    grids = syntheticGrids(biomeIds)
+    stream = io.BytesIO()
+    biom.CsSF_Biom.build_stream(
+        dict(magic=biom.BIOM_MAGIC, biomeIds=biomeIds, **{k: v.tolist() for k, v in grids.items()}), stream
+    )
+    assert biom.buildBiom(np.array(biomeIds, dtype=np.uint32), **grids).tobytes() == stream.getvalue()
+
+
+def test_parseBiom_matches_construct_layout(planet):
+    pytest.importorskip("construct")
+    parsed = biom.CsSF_Biom.parse(planet)
+    record = biom.parseBiom(planet)
+    for name in ("biomeIds", "biomeGridN", "resrcGridN", "biomeGridS", "resrcGridS"):
+        assert record[name].tolist() == list(parsed[name])
+
+
+def test_parseBiom_rejects_bad_consts(planet):
+    data = bytearray(planet)
+    data[0] = 0
+    with pytest.raises(ValueError):
+        biom.parseBiom(data)
+
+
+def test_load_save_round_trip(planet, writePlanet, tmp_path):
+    biom_file = biom.BiomFile()
+    biom_file.load(writePlanet(planet))
+    out = tmp_path / "out.biom"
+    biom_file.save(str(out))
+    assert out.read_bytes() == planet
+
+
+def test_writeBiomAtomic_keeps_old_file_on_failure(planet, writePlanet, tmp_path):
+    path = writePlanet(planet)
+    corrupt = bytearray(planet)
+    corrupt[0] ^= 0xFF
+    with pytest.raises(ValueError):
+        biom.writeBiomAtomic(path, corrupt)
+    with pytest.raises(OSError):
+        biom.writeBiomAtomic(str(tmp_path / "missing" / "planet.biom"), planet)
+    with open(path, "rb") as f:
+        assert f.read() == planet
+    assert [p.name for p in tmp_path.iterdir()] == ["planet.biom"]
+
+
+def test_save_drops_unpainted_biomes(writePlanet, tmp_path):
+    biom_file = biom.BiomFile()
+    biom_file.load(writePlanet(syntheticBiom([0x10, 0x20, 0x30])))
+    biom_file.biomeGridN = np.where(biom_file.biomeGridN == 0x20, 0x10, biom_file.biomeGridN)
+    biom_file.biomeGridS = np.where(biom_file.biomeGridS == 0x20, 0x30, biom_file.biomeGridS)
+    biom_file.save(str(tmp_path / "out.biom"))
+    assert biom.parseBiom((tmp_path / "out.biom").read_bytes())["biomeIds"].tolist() == [0x10, 0x30]
+
+
+def test_texture_imgToArray_round_trip(planet, writePlanet):
+    biom_file = biom.BiomFile()
+    biom_file.load(writePlanet(planet))
+    biome_img, res_img = biom_file.texture()
+
+    rebuilt = biom.BiomFile()
+    rebuilt.biomeIds = biom_file.biomeIds
+    rebuilt.imgToArray(np.asarray(biome_img.convert("RGB")), np.asarray(res_img.convert("RGB")))
+    assert rebuilt.biomeIds == biom_file.biomeIds
+    for name, grid in biom_file.to_ids().items():
+        np.testing.assert_array_equal(rebuilt.to_ids()[name], grid)
+
+
+def test_pixelsToIds_reports_off_palette_pixels():
+    img = np.asarray(biom.indexedImage(np.zeros((4, 6), dtype=np.uint8)).convert("RGB")).copy()
+    img[1, 2] = (1, 2, 3)
+    img[3, 5] = (4, 5, 6)
+    with pytest.raises(ValueError, match=r"biome image has 2 off-palette pixels at \(x, y\): \(2, 1\), \(5, 3\)"):
+        biom.pixelsToIds(img, [0x1234], "biome image")
+
+
+def test_paletteIndices_reads_reordered_palettes():
+    from PIL import Image
+
+    indices = np.random.default_rng(0).integers(0, 12, size=(8, 16)).astype(np.uint8)
+    colors = np.asarray(biom.palette.palettedata_lists[:12], dtype=np.uint8)
+    # The same picture saved by an editor that sorted and trimmed the palette
+    order = np.argsort(biom.packRGB(colors))
+    reordered = Image.fromarray(np.argsort(order).astype(np.uint8)[indices], mode="P")
+    reordered.putpalette(colors[order].ravel().tolist())
+    buffer = io.BytesIO()
+    reordered.save(buffer, "PNG")
+
+    img = Image.open(buffer)
+    assert img.mode == "P"
+    np.testing.assert_array_equal(biom.paletteIndices(img), indices)
+    np.testing.assert_array_equal(biom.pixelsToIds(img, np.arange(12) * 10), indices * 10)
+
+
+def test_derived_id_grids_are_read_only(planet, writePlanet):
+    biom_file = biom.BiomFile()
+    biom_file.load(writePlanet(planet))
+    with pytest.raises(ValueError):
+        biom_file.biomeGridN[0] = biom_file.biomeIds[0]
+
+
+def test_idsToIndices_reports_unknown_ids_in_hex():
+    grid = np.array([0x1234, 0xDEAD, 0xDEAD], dtype=np.uint32)
+    with pytest.raises(ValueError, match=r"2 cells with unknown IDs: 0000dead \(2 cells\)"):
+        biom.idsToIndices(grid, [0x1234], "biomeGridN")
+
+
+def test_remapBiomes_merges_biomes(planet, writePlanet):
+    biom_file = biom.BiomFile()
+    biom_file.load(writePlanet(planet))
+    before = biom_file.biomeGridN
+    biom_file.remapBiomes({0x5678: 0x1234})
+    assert 0x5678 not in biom_file.biomeIds
+    np.testing.assert_array_equal(biom_file.biomeGridN, np.where(before == 0x5678, 0x1234, before))
+
+
+def test_remapTable_keeps_large_tables():
+    table, lut = biom.remapTable(range(1, 400), {1: 2})
+    assert len(table) == 398
+    assert lut.dtype == np.uint32
+    assert lut[[0, 1, -1]].tolist() == [0, 0, 397]
+
+
+def test_readBiomeMapping(tmp_path):
+    path = tmp_path / "mapping.csv"
+    path.write_text(
+        "# old,new\n"
+        "00001234,00005678\n"
+        "\n"
+        "frozenlifelondinion  DesertRockyLife06  # EDIDs, any case\n"
+    )
+    assert biom.readBiomeMapping(str(path)) == {0x1234: 0x5678, 0x1CA06: 0x24FC4}
+
+    path.write_text("1234,5678\n1234,9abc\n")
+    with pytest.raises(ValueError, match="mapping.csv:2: 00001234 is mapped twice"):
+        biom.readBiomeMapping(str(path))
+    path.write_text("1234,NoSuchBiome\n")
+    with pytest.raises(ValueError, match="mapping.csv:1: 'NoSuchBiome'"):
+        biom.readBiomeMapping(str(path))
+
+
+def test_remapImagePixels_recolors_like_remapBiomes(planet, writePlanet):
+    from benchmarks import bench_biom
+
+    biom_file = biom.BiomFile()
+    biom_file.load(writePlanet(planet))
+    image = bench_biom.StubImage("biomes", 1, 1)
+    biom.writeImagePixels(image, biom_file.texture()[0])
+    before = np.concatenate((biom_file.biomeIdxGridN, biom_file.biomeIdxGridS))
+    lut = biom_file.remapBiomes({0x5678: 0x1234, 0x9ABC: 0x5678})
+
+    assert biom.remapImagePixels(image, lut) == np.count_nonzero(lut[before] != before)
+    np.testing.assert_array_equal(
+        biom.readImagePixels(image), np.asarray(biom_file.texture()[0].convert("RGB"))
+    )
+
+
+def test_biomeAreaFractions_weight_cells_by_area():
+    biom_file = biom.BiomFile()
+    biom_file.biomeIds = (0x1234, 0x5678, 0x9ABC, 0xDEF0)
+    gridN = np.zeros(biom.GRID_SIZE, dtype=np.uint8)
+    gridS = np.ones(biom.GRID_SIZE, dtype=np.uint8)
+    # 256 cells each: in the middle of the north disk and in the south corners
+    gridN[120:136, 120:136] = 2
+    for rows in (slice(0, 8), slice(-8, None)):
+        for cols in (slice(0, 8), slice(-8, None)):
+            gridS[rows, cols] = 3
+    biom_file.biomeIdxGridN, biom_file.biomeIdxGridS = gridN.ravel(), gridS.ravel()
+    biom_file.resrcGridN = np.full(gridN.size, 8, dtype=np.uint8)
+    biom_file.resrcGridS = np.full(gridS.size, 88, dtype=np.uint8)
+
+    fractions = biom_file.biomeAreaFractions
+    assert sum(fractions.values()) == pytest.approx(1.0)
+    assert fractions[0x1234] + fractions[0x9ABC] == pytest.approx(0.5)
+    assert fractions[0x5678] + fractions[0xDEF0] == pytest.approx(0.5)
+    assert fractions[0x9ABC] > 3 * fractions[0xDEF0]
+    assert biom_file.resourceAreaFractions == pytest.approx({8: 0.5, 88: 0.5})
+
+
+def test_mmap_biome_writes_are_checked(planet, writePlanet):
+    path = writePlanet(planet)
+    biom_file = biom.BiomFile.open_mmap(path)
+    with pytest.raises(ValueError):
+        np.asarray(biom_file.biomeGridN)[0] = 0xDEAD
+    with pytest.raises(ValueError):
+        biom_file.setBiomes("biomeGridN", slice(0, 10), 0xDEAD)
+    biom_file.setBiomes("biomeGridN", slice(None), 0x5678)
+    assert set(biom_file.biomeGridN.tolist()) == {0x5678}
+    biom_file.flush()
+    del biom_file
+
+    with open(path, "rb") as f:
+        record = biom.parseBiom(f.read())
+    assert set(record["biomeGridN"].tolist()) == {0x5678}
+
+    copy = biom.BiomFile.open_mmap(path, mode="c")
+    copy.setBiomes("biomeGridS", 0, 0x5678)
+    assert copy.biomeGridS[0] == 0x5678
+    with pytest.raises(ValueError):
+        biom.BiomFile.open_mmap(path, mode="r").setBiomes("biomeGridS", 0, 0x5678)
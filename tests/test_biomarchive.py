@@ -0,0 +1,80 @@
+import pytest
+
+import biomarchive
+from conftest import syntheticBiom
+
+IDS = [0x1234, 0x5678, 0x9ABC]
+
+
+@pytest.fixture
+def planets():
+    return {f"planet{seed}": syntheticBiom(IDS, seed) for seed in range(3)}
+
+
+def test_add_and_read(tmp_path, planets):
+    path = str(tmp_path / "planets.biomarchive")
+    with biomarchive.BiomArchive(path, "w") as archive:
+        archive.addMany(planets.items())
+        assert archive.garbage() == 0
+
+    with biomarchive.BiomArchive(path) as archive:
+        assert archive.names() == list(planets)
+        for name, data in planets.items():
+            assert archive.read(name) == data
+            assert archive.record(name)["biomeIds"].tolist() == IDS
+            assert archive.load(name).biomeIds == tuple(IDS)
+        with pytest.raises(ValueError):
+            archive.add("planet9", planets["planet0"])
+
+
+def test_pack_unpack_round_trip(tmp_path, planets):
+    for name, data in planets.items():
+        (tmp_path / f"{name}.biom").write_bytes(data)
+    path = str(tmp_path / "planets.biomarchive")
+    assert biomarchive.pack(path, sorted(tmp_path.glob("*.biom"))) == len(planets)
+    assert biomarchive.unpack(path, str(tmp_path / "out")) == len(planets)
+    for name, data in planets.items():
+        assert (tmp_path / "out" / f"{name}.biom").read_bytes() == data
+
+
+def test_replace_remove_compact(tmp_path, planets):
+    path = str(tmp_path / "planets.biomarchive")
+    replacement = syntheticBiom(IDS, seed=7)
+    with biomarchive.BiomArchive(path, "w") as archive:
+        archive.addMany(planets.items())
+        with pytest.raises(KeyError):
+            archive.add("planet0", replacement)
+        archive.add("planet0", replacement, replace=True)
+        archive.remove("planet1")
+        assert archive.garbage() > 0
+
+        archive.compact()
+        assert archive.garbage() == 0
+        assert archive.read("planet0") == replacement
+        assert archive.read("planet2") == planets["planet2"]
+        assert "planet1" not in archive
+
+
+def test_open_mmap_edits_in_place(tmp_path, planets):
+    path = str(tmp_path / "planets.biomarchive")
+    with biomarchive.BiomArchive(path, "w") as archive:
+        archive.addMany(planets.items())
+
+    with biomarchive.BiomArchive(path, "r+") as archive:
+        biom_file = archive.open_mmap("planet1")
+        biom_file.resrcGridN[:10] = 88
+        biom_file.flush()
+        del biom_file
+
+    with biomarchive.BiomArchive(path) as archive:
+        assert archive.record("planet1")["resrcGridN"][:10].tolist() == [88] * 10
+        assert archive.read("planet0") == planets["planet0"]
+        with pytest.raises(ValueError):
+            archive.open_mmap("planet1")
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not.biomarchive"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        biomarchive.BiomArchive(str(path))
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+import biomcache
+from conftest import syntheticBiom
+
+
+def test_hit_after_miss(tmp_path, planet, writePlanet):
+    cache = biomcache.BiomCache(str(tmp_path / "cache"))
+    path = writePlanet(planet)
+    decoded, biome_img, _ = cache.load(path)
+    cached, cached_img, _ = cache.load(writePlanet(planet, "copy"))
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached.planet_name == "copy"
+    assert cached.biomeIds == decoded.biomeIds
+    for name, grid in decoded.to_ids().items():
+        np.testing.assert_array_equal(cached.to_ids()[name], grid)
+    np.testing.assert_array_equal(np.asarray(cached_img), np.asarray(biome_img))
+
+
+def test_evicts_least_recently_used(tmp_path, writePlanet):
+    cache = biomcache.BiomCache(str(tmp_path / "cache"))
+    paths = [writePlanet(syntheticBiom([0x1234, 0x5678], seed), f"planet{seed}") for seed in range(3)]
+    entries = [cache.entryPath(cache.key(path)) for path in paths]
+    for age, (path, entry) in enumerate(zip(paths[:2], entries)):
+        cache.load(path)
+        os.utime(entry, ns=(age, age))
+    cache.load(paths[0])
+    assert cache.hits == 1
+
+    # Room for two entries: the third load evicts planet1, used least recently
+    cache.max_bytes = sum(size for _, size, _ in cache.entries()) + 1
+    cache.load(paths[2])
+    assert {path for path, _, _ in cache.entries()} == {entries[0], entries[2]}
@@ -0,0 +1,37 @@
+from biomeregistry import BiomeRegistry
+
+
+def registry():
+    return BiomeRegistry([
+        (0x0001A2B3, "DesertRocky01", "Rocky Desert"),
+        (0x0001A2B4, "DesertSandy01", "Sandy Desert"),
+        (0x0002C3D4, "ForestTemperate", "Temperate Forest"),
+        (0x0002C3D5, "OceanFrozen", "Frozen Ocean"),
+    ])
+
+
+def names(results):
+    return [name for _, _, name in results]
+
+
+def test_form_id_returns_one_biome():
+    assert registry().search("0002c3d4") == [(0x0002C3D4, "ForestTemperate", "Temperate Forest")]
+    assert names(registry().search("1a2b")) == ["Rocky Desert", "Sandy Desert"]
+
+
+def test_prefix_ranks_before_substring():
+    assert names(registry().search("desert")) == ["Rocky Desert", "Sandy Desert"]
+    assert names(registry().search("sert")) == ["Rocky Desert", "Sandy Desert"]
+    assert names(registry().search("ocean froz")) == ["Frozen Ocean"]
+    # "ocean" starts with "o", "rocky" and "forest" only contain it
+    assert names(registry().search("o")) == ["Frozen Ocean", "Rocky Desert", "Temperate Forest"]
+
+
+def test_fuzzy_matches_typos():
+    assert names(registry().search("temprate")) == ["Temperate Forest"]
+    assert names(registry().search("sandy dessert")) == ["Sandy Desert"]
+    assert registry().search("volcanic") == []
+
+
+def test_empty_query_lists_the_table():
+    assert names(registry().search("", limit=2)) == ["Rocky Desert", "Sandy Desert"]
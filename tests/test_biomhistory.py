@@ -0,0 +1,105 @@
+import numpy as np
+
+import biom
+import biomhistory
+
+
+def makePlanet(biomeIds):
+    biom_file = biom.BiomFile()
+    biom_file.biomeIds = tuple(biomeIds)
+    cells = np.arange(biom.GRID_FLATSIZE)
+    biom_file.biomeIdxGridN = (cells // 1024 % len(biomeIds)).astype(np.uint8)
+    biom_file.biomeIdxGridS = (cells // 4096 % len(biomeIds)).astype(np.uint8)
+    biom_file.resrcGridN[:] = 8
+    biom_file.resrcGridS[:] = 88
+    return biom_file
+
+
+def state(biom_file):
+    return biom_file.biomeIds, {name: np.array(grid) for name, grid in biom_file.to_ids().items()}
+
+
+def assertState(biom_file, expected):
+    biomeIds, grids = expected
+    assert biom_file.biomeIds == biomeIds
+    for name, grid in biom_file.to_ids().items():
+        np.testing.assert_array_equal(grid, grids[name])
+
+
+def test_undo_redo_restores_every_step():
+    biom_file = makePlanet([0x10, 0x20, 0x30])
+    history = biomhistory.GridHistory()
+    history.push(biom_file, "load")
+    states = [state(biom_file)]
+
+    biom_file.biomeIdxGridN[:500] = 2
+    biom_file.resrcGridS[100:200] = 0
+    history.push(biom_file, "paint")
+    states.append(state(biom_file))
+
+    biom_file.remapBiomes({0x20: 0x10})
+    history.push(biom_file, "merge")
+    states.append(state(biom_file))
+
+    biom_file.remapBiomes({0x30: 0x40})
+    history.push(biom_file, "replace")
+    states.append(state(biom_file))
+
+    for expected in reversed(states[:-1]):
+        assert history.undo(biom_file) is not None
+        assertState(biom_file, expected)
+    assert history.undo(biom_file) is None
+
+    for expected in states[1:]:
+        assert history.redo(biom_file) is not None
+        assertState(biom_file, expected)
+    assert not history.canRedo
+
+
+def test_push_without_changes_records_nothing():
+    biom_file = makePlanet([0x10, 0x20])
+    history = biomhistory.GridHistory()
+    assert history.push(biom_file) is None
+    assert history.push(biom_file) is None
+    assert not history.canUndo
+
+
+def test_summary_compares_biome_ids():
+    biom_file = makePlanet([0x10, 0x20, 0x30])
+    history = biomhistory.GridHistory()
+    history.push(biom_file)
+    before = biom_file.biomeGridN.copy(), biom_file.biomeGridS.copy()
+
+    # Dropping 0x10 shifts every index; only cells that were 0x10 change
+    biom_file.remapBiomes({0x10: 0x20})
+    delta = history.push(biom_file, "merge")
+    moved = sum(int(np.count_nonzero(grid == 0x10)) for grid in before)
+    assert delta.cells == moved
+    assert delta.summary["biomes"][0x10] == [moved, 0]
+    assert delta.summary["biomes"][0x20] == [0, moved]
+    assert 0x30 not in delta.summary["biomes"]
+    assert "(removed)" in delta.describe()
+
+
+def test_paint_summary_counts_resources():
+    biom_file = makePlanet([0x10, 0x20])
+    history = biomhistory.GridHistory()
+    history.push(biom_file)
+    biom_file.resrcGridN[:50] = 0
+    delta = history.push(biom_file, "paint")
+    assert delta.cells == 50
+    assert delta.summary["resources"] == {8: [50, 0], 0: [0, 50]}
+
+
+def test_evicts_oldest_steps():
+    biom_file = makePlanet([0x10, 0x20])
+    history = biomhistory.GridHistory()
+    history.push(biom_file)
+    for step in range(5):
+        biom_file.resrcGridN[step * 1000:(step + 1) * 1000] = 0
+        history.push(biom_file, f"step {step}")
+    history.max_bytes = history.nbytes - 1
+    history.evict()
+    undo, redo = history.steps()
+    assert len(undo) == 4 and undo[0].label == "step 1"
+    assert history.nbytes <= history.max_bytes
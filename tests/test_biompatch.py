@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import biom
+import biompatch
+from conftest import syntheticBiom
+
+
+def editedPlanet(source, mapping, cells=slice(0, 300)):
+    """Copy of source with some cells repainted and a biome table change."""
+    record = biom.parseBiom(bytearray(source))
+    biomeIds = [mapping.get(id, id) for id in record["biomeIds"].tolist()]
+    grids = {name: np.array(record[name]) for name, _ in biompatch.PATCH_GRIDS}
+    for name in ("biomeGridN", "biomeGridS"):
+        grids[name] = np.array([mapping.get(id, id) for id in grids[name].tolist()], dtype=np.uint32)
+    grids["biomeGridS"][cells] = biomeIds[0]
+    grids["resrcGridN"][cells] = 88
+    return biom.buildBiom(np.array(sorted(set(biomeIds)), dtype=np.uint32), **grids).tobytes()
+
+
+def test_changedRuns_round_trip():
+    old = np.zeros(20, dtype=np.uint8)
+    new = old.copy()
+    new[[2, 3, 4, 9, 15, 16]] = 1
+    starts, lengths = biom.changedRuns(old, new)
+    assert starts.tolist() == [2, 9, 15]
+    assert lengths.tolist() == [3, 1, 2]
+    assert biom.runPositions(starts, lengths).tolist() == [2, 3, 4, 9, 15, 16]
+
+
+def test_diff_apply_reproduces_target(planet):
+    target = editedPlanet(planet, {0x5678: 0xABCDEF})
+    patch = biompatch.diffBiom(planet, target)
+    assert biompatch.applyPatch(planet, patch) == target
+
+    decoded = biompatch.BiomPatch.frombytes(patch.tobytes())
+    assert decoded.cells == patch.cells
+    assert biompatch.applyPatch(planet, decoded) == target
+
+
+def test_diff_summary(planet):
+    target = editedPlanet(planet, {0x5678: 0xABCDEF})
+    summary = biompatch.diffBiom(planet, target).summary
+    assert summary["biomeIdsAdded"] == [0xABCDEF]
+    assert summary["biomeIdsRemoved"] == [0x5678]
+    source, edited = biom.parseBiom(planet), biom.parseBiom(target)
+    changed = np.concatenate([
+        (source["biomeGridN"] != edited["biomeGridN"]) | (source["resrcGridN"] != edited["resrcGridN"]),
+        (source["biomeGridS"] != edited["biomeGridS"]) | (source["resrcGridS"] != edited["resrcGridS"]),
+    ])
+    assert summary["cells"] == np.count_nonzero(changed)
+    lost, gained = summary["resources"][88]
+    assert gained >= lost
+
+
+def test_identical_files_give_empty_patch(planet):
+    patch = biompatch.diffBiom(planet, planet)
+    assert patch.cells == 0
+    assert biompatch.applyPatch(planet, patch) == planet
+
+
+def test_apply_rejects_other_source(planet):
+    other = syntheticBiom([0x1234, 0x5678, 0x9ABC, 0x100000], seed=1)
+    patch = biompatch.diffBiom(planet, editedPlanet(planet, {}))
+    with pytest.raises(ValueError):
+        biompatch.applyPatch(other, patch)
+
+
+def test_frombytes_rejects_garbage():
+    with pytest.raises(ValueError):
+        biompatch.BiomPatch.frombytes(b"not a patch at all")
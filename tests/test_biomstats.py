@@ -0,0 +1,35 @@
+import pytest
+
+import biomstats
+from conftest import syntheticBiom
+
+
+def test_findPlanets_reports_bad_sources(tmp_path, planet, writePlanet):
+    good = writePlanet(planet)
+    bad = tmp_path / "bad.biomarchive"
+    bad.write_bytes(b"junk")
+    missing = str(tmp_path / "missing")
+
+    items, failed = biomstats.findPlanets([str(tmp_path), missing])
+    assert items == [good]
+    assert set(failed) == {str(bad), missing}
+
+    stats = biomstats.analyze([str(tmp_path), missing], jobs=1)
+    assert stats.planets == 1
+    assert set(stats.failed) == {str(bad), missing}
+    assert biomstats.main([missing, "-o", str(tmp_path / "out.json")]) == 1
+
+
+def test_merged_chunks_match_one_pass(writePlanet):
+    items = [writePlanet(syntheticBiom([0x1234, 0x5678, 0xDEAD], seed), f"planet{seed}") for seed in range(4)]
+    items.append(items[0].replace("planet0", "missing"))
+    whole = biomstats.analyzeChunk(items)
+    merged = biomstats.analyzeChunk(items[:2]).merge(biomstats.analyzeChunk(items[2:]))
+
+    assert merged.planets == whole.planets == 4
+    for name in ("biomeCells", "biomePlanets", "resourceCells", "resourcePlanets", "pairCells", "pairPlanets"):
+        assert getattr(merged, name) == getattr(whole, name)
+    assert merged.biomeArea == pytest.approx(whole.biomeArea)
+    assert merged.unknown == whole.unknown
+    assert sorted(merged.unknown[("biome", 0xDEAD)]) == items[:4]
+    assert list(merged.failed) == [items[4]]
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+import biom
+from benchmarks import bench_biom
+
+SHAPE = (2 * biom.GRID_SIZE[0], biom.GRID_SIZE[1])
+
+
+@pytest.fixture
+def addon(tmp_path):
+    """The addon's __init__.py against the benchmarks' stub bpy, writing under tmp_path."""
+    return bench_biom.importAddon(str(tmp_path))
+
+
+def paint(addon, biomeIdx, resrcIdx=None):
+    if resrcIdx is None:
+        resrcIdx = np.zeros(SHAPE, dtype=np.uint8)
+    biom.writeImagePixels(addon.planetImage("planet", "biomes"), biom.indexedImage(biomeIdx))
+    biom.writeImagePixels(addon.planetImage("planet", "resources"), biom.indexedImage(resrcIdx))
+
+
+def test_unchanged_layers_are_reused(addon):
+    biomeIdx = np.zeros(SHAPE, dtype=np.uint8)
+    biomeIdx[:, 128:] = 1
+    paint(addon, biomeIdx)
+    assert addon.genLayerImages("planet") == 3
+    assert addon.genLayerImages("planet") == 0
+
+    # Recoloring part of biome 1 only renders its layer and the new one;
+    # biome 0's layer may be renamed, but isn't rendered again
+    colors = [f"#{color:06x}" for color in biom.packRGB(biom.palette.palettedata_lists[:3]).tolist()]
+    layerFile = lambda color: next(
+        layer["files"][0] for layer in addon.readLayerManifest("planet")["maps"]["biomes"] if layer["color"] == color
+    )
+    os.utime(os.path.join(addon.layers_folder, layerFile(colors[0])), ns=(0, 0))
+    biomeIdx[:100, 128:] = 2
+    paint(addon, biomeIdx)
+    assert addon.genLayerImages("planet") == 2
+    assert os.stat(os.path.join(addon.layers_folder, layerFile(colors[0]))).st_mtime_ns == 0
+    assert all(os.path.isfile(os.path.join(addon.layers_folder, layerFile(color))) for color in colors)
+
+
+def test_stale_layer_files_are_removed(addon):
+    biomeIdx = np.zeros(SHAPE, dtype=np.uint8)
+    for idx in range(1, 5):
+        biomeIdx[:, 50 * idx:] = idx
+    paint(addon, biomeIdx)
+    listing = lambda: sorted(f for f in os.listdir(addon.layers_folder) if not f.endswith(".json"))
+
+    assert addon.genLayerImages("planet") == 6
+    assert len(listing()) == 12
+
+    assert addon.genLayerImages("planet", layer_format="rgba") == 6
+    manifest = addon.readLayerManifest("planet")
+    assert listing() == manifest["files"] == [
+        "planet_biomes_layers_pack0.png", "planet_biomes_layers_pack0_EDGE.png",
+        "planet_biomes_layers_pack1.png", "planet_biomes_layers_pack1_EDGE.png",
+        "planet_resources_layers_pack0.png", "planet_resources_layers_pack0_EDGE.png",
+    ]
+    assert [(layer["file"], layer["channel"]) for layer in manifest["maps"]["biomes"]] == [
+        ("planet_biomes_layers_pack0.png", channel) for channel in "RGBA"
+    ] + [("planet_biomes_layers_pack1.png", "R")]
+
+    biomeIdx[biomeIdx == 4] = 3
+    paint(addon, biomeIdx)
+    assert addon.genLayerImages("planet", layer_format="rgba") == 4
+    assert listing() == [
+        "planet_biomes_layers_pack0.png", "planet_biomes_layers_pack0_EDGE.png",
+        "planet_resources_layers_pack0.png", "planet_resources_layers_pack0_EDGE.png",
+    ]
@@ -0,0 +1,34 @@
+import numpy as np
+
+import planetmesh
+
+
+def test_cell_solid_angles_cover_sphere():
+    angles = planetmesh.cellSolidAngles()
+    assert angles.shape == (2, 256 * 256)
+    assert np.all(angles > 0)
+    assert np.isclose(angles.sum(), 4 * np.pi)
+    np.testing.assert_allclose(angles[0], angles[1])
+
+
+def test_square_border_is_equator():
+    edge = np.linspace(-1, 1, 101)
+    for a, b in ((edge, np.ones_like(edge)), (-np.ones_like(edge), edge)):
+        for north in (True, False):
+            directions = planetmesh.hemisphereDirections(a, b, north)
+            np.testing.assert_allclose(directions[:, 2], 0, atol=1e-12)
+    pole = planetmesh.hemisphereDirections(0.0, 0.0, north=True)
+    np.testing.assert_allclose(pole, [0, 0, 1], atol=1e-12)
+
+
+def test_mesh_is_closed_and_outward():
+    verts, faces, loop_uvs = planetmesh.planetMeshData(16)
+    # Hemispheres share their equator vertices
+    assert len(verts) == 2 * 17 * 17 - 4 * 16
+    assert loop_uvs.shape == (faces.size, 2)
+    edges = np.sort(np.stack((faces, np.roll(faces, -1, axis=1)), axis=-1).reshape(-1, 2), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    assert np.all(counts == 2)
+    corners = verts[faces]
+    normals = np.cross(corners[:, 2] - corners[:, 0], corners[:, 3] - corners[:, 1])
+    assert np.all(np.einsum("ij,ij->i", normals, corners.mean(axis=1)) > 0)